@@ -8,6 +8,7 @@ class Settings(BaseSettings):
     API_VERSION: str = "1.0.0"
     API_HOST: str = "0.0.0.0"
     API_PORT: int = 8000
+    API_WORKERS: int = 1
     
     DATABASE_URL: str = os.getenv("DATABASE_URL","")
 
@@ -22,6 +23,11 @@ class Settings(BaseSettings):
     OLLAMA_MODEL: str = "qwen2.5:7b"
     OLLAMA_TEMPERATURE: float = 0.0
     OLLAMA_MAX_TOKENS: int = 4000
+    OLLAMA_NUM_CTX: int = 8192
+    OLLAMA_KEEP_ALIVE: str = "30m"
+    
+    SQL_MAX_OUTPUT_TOKENS: int = 512
+    LLM_MAX_CONCURRENCY: int = 16
     
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY","")
     OPENAI_MODEL: str = "gpt-4o"
@@ -33,10 +39,21 @@ class Settings(BaseSettings):
     GEMINI_TEMPERATURE: float = 0.0
     GEMINI_MAX_TOKENS: int = 4000
     
+    EMBEDDING_BACKEND: str = ""
+    EMBEDDING_ONNX_FILE: str = ""
+    EMBEDDING_BATCH_SIZE: int = 64
+    TORCH_NUM_THREADS: int = 0
+    RERANKER_MODEL: str = ""
+    
     CACHE_TTL: int = 300
+    QUERY_CACHE_SIZE: int = 512
+    QUERY_CACHE_SIMILARITY: float = 0.90
+    SCHEMA_CONTEXT_TOKEN_BUDGET: int = 3000
     SCHEMA_CACHE_TTL: int = 1800
     
     CONNECTION_TIMEOUT: int = 300
+    DB_POOL_SIZE: int = 16
+    DB_MAX_OVERFLOW: int = 8
     QUERY_TIMEOUT: int = 60
     MAX_RETRIES: int = 3
     
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import time
 from contextlib import asynccontextmanager
@@ -5,7 +6,7 @@ from pathlib import Path
 
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 
 from app.config import settings
@@ -38,7 +39,7 @@ async def lifespan(app: FastAPI):
         logger.info("Initializing services...")
         service = get_text_to_sql_service()
         
-        if service.database_service.test_connection():
+        if await asyncio.to_thread(service.database_service.test_connection):
             logger.info("Database connection successful")
         else:
             logger.warning("Database connection failed during startup")
@@ -67,6 +68,7 @@ def create_app() -> FastAPI:
         """,
         docs_url="/docs",
         redoc_url="/redoc",
+        default_response_class=ORJSONResponse,
         lifespan=lifespan
     )
     
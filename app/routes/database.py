@@ -1,5 +1,6 @@
 """Database-related routes"""
 
+import asyncio
 import logging
 from fastapi import APIRouter, Depends, HTTPException, Path
 
@@ -25,7 +26,7 @@ async def get_tables(
     """
     try:
         logger.info("Retrieving database tables information")
-        return service.get_database_info()
+        return await asyncio.to_thread(service.get_database_info)
     
     except Exception as e:
         logger.error(f"Failed to get tables information: {str(e)}")
@@ -45,7 +46,7 @@ async def get_table_names(
     """
     try:
         logger.info("Retrieving table names")
-        table_names = service.database_service.get_table_names()
+        table_names = await asyncio.to_thread(service.database_service.get_table_names)
         
         return {
             "table_names": table_names,
@@ -74,7 +75,7 @@ async def describe_table(
     """
     try:
         logger.info(f"Describing table: {table_name}")
-        result = service.get_table_description(table_name)
+        result = await asyncio.to_thread(service.get_table_description, table_name)
         
         if not result.get("success", True):
             raise HTTPException(
@@ -107,7 +108,7 @@ async def get_database_schema(
     """
     try:
         logger.info("Retrieving complete database schema")
-        table_info = service.get_database_info()
+        table_info = await asyncio.to_thread(service.get_database_info)
         
         return {
             "database_type": "Microsoft SQL Server",
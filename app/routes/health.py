@@ -26,7 +26,7 @@ async def health_check(
     """
     try:
         logger.debug("Performing comprehensive health check")
-        status_data = service.get_health_status(include_table_count=True)
+        status_data = await service.get_health_status(include_table_count=True)
         
         return HealthStatus(**status_data)
     
@@ -51,7 +51,7 @@ async def quick_health_check(
     """
     try:
         logger.debug("Performing quick health check")
-        status_data = service.get_quick_health_status()
+        status_data = await service.get_quick_health_status()
         
         return QuickHealthStatus(**status_data)
     
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import logging
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks
@@ -263,17 +264,13 @@ async def search_tables(
                 detail="No metadata loaded. Please upload metadata file first."
             )
         
-        results = service.enhanced_schema_store.search(query, k=limit)
+        results = await service.enhanced_schema_store.asearch(query, k=limit)
         
-        formatted_results = []
-        for table_name, schema_text, metadata in results:
-            formatted_results.append({
-                "table_name": table_name,
-                "schema_summary": schema_text[:500] + "..." if len(schema_text) > 500 else schema_text,
-                "purpose": metadata.get("llm_analysis", {}).get("purpose", ""),
-                "data_patterns": metadata.get("llm_analysis", {}).get("data_patterns", []),
-                "relationships": metadata.get("llm_analysis", {}).get("relationships", [])
-            })
+        store = service.enhanced_schema_store
+        formatted_results = [
+            store.result_summary(table_name, schema_text, metadata)
+            for table_name, schema_text, metadata in results
+        ]
         
         return {
             "query": query,
@@ -298,7 +295,7 @@ async def clear_knowledge_base(
 ):
     try:
         if hasattr(service, 'enhanced_schema_store'):
-            service.enhanced_schema_store.clear_all()
+            await asyncio.to_thread(service.enhanced_schema_store.clear_all)
         
         return {
             "success": True,
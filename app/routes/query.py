@@ -1,7 +1,13 @@
+import asyncio
+import itertools
 import logging
+
+import orjson
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 
 from ..schemas.query import QueryRequest, SQLRequest, QueryResponse
+from ..services.database import is_select_query
 from ..services.text_to_sql import TextToSQLService
 from ..core.dependencies import get_text_to_sql_service
 
@@ -66,6 +72,37 @@ async def execute_natural_language_query(
         )
 
 
+@router.post("/stream", summary="Generate SQL query from natural language, streaming it as it is written")
+async def stream_natural_language_query(
+    request: QueryRequest,
+    service: TextToSQLService = Depends(get_text_to_sql_service)
+) -> StreamingResponse:
+    """
+    Convert natural language to SQL query, streamed as Server-Sent Events.
+    
+    **Events:**
+    - `sql`: a raw chunk of the SQL as the LLM writes it, for immediate display
+    - `result`: the final response, with the same fields as `POST /query/`
+    
+    The `result` event carries the cleaned and validated SQL, which may differ from
+    the streamed text if the query had to be repaired.
+    """
+    if not request.command.strip():
+        raise HTTPException(
+            status_code=400,
+            detail="Query command cannot be empty"
+        )
+    
+    logger.info(f"Streaming SQL generation for query: {request.command[:100]}...")
+    
+    async def encode_events():
+        async for event, payload in service.process_query_stream(request.command):
+            data = payload.model_dump() if event == "result" else payload
+            yield b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+    
+    return StreamingResponse(encode_events(), media_type="text/event-stream")
+
+
 @router.post("/sql", response_model=QueryResponse, summary="Execute direct SQL query")
 async def execute_direct_sql_query(
     request: SQLRequest,
@@ -124,6 +161,55 @@ async def execute_direct_sql_query(
         )
 
 
+@router.post("/sql/stream", summary="Execute direct SQL query and stream the rows")
+async def stream_direct_sql_query(
+    request: SQLRequest,
+    service: TextToSQLService = Depends(get_text_to_sql_service)
+) -> StreamingResponse:
+    """
+    Execute SQL query directly and stream its rows as NDJSON.
+    
+    Each line is a JSON array of up to 1000 row objects, read from a server-side
+    cursor, so large result sets are never held in memory at once. A query with
+    no rows returns a single empty array. Only SELECT queries can be streamed;
+    run other statements through /query/sql.
+    """
+    if not request.sql_query.strip():
+        raise HTTPException(
+            status_code=400,
+            detail="SQL query cannot be empty"
+        )
+    
+    if not is_select_query(request.sql_query):
+        raise HTTPException(
+            status_code=400,
+            detail="Only SELECT queries can be streamed; use /query/sql for other statements"
+        )
+    
+    logger.info(f"Streaming direct SQL query: {request.sql_query[:100]}...")
+    batches = service.database_service.stream_sql_rows(request.sql_query)
+    
+    try:
+        # Fetch the first batch before responding so execution errors still return a 500
+        first_batch = await asyncio.to_thread(next, batches, None)
+    except Exception as e:
+        logger.error(f"Failed to stream direct SQL: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"SQL execution failed: {str(e)}"
+        )
+    
+    def encode_batches():
+        if first_batch is None:
+            yield b"[]\n"
+            return
+        
+        for rows in itertools.chain([first_batch], batches):
+            yield orjson.dumps(rows, default=str) + b"\n"
+    
+    return StreamingResponse(encode_batches(), media_type="application/x-ndjson")
+
+
 @router.get("/examples", summary="Get example queries")
 async def get_example_queries():
     """
@@ -290,31 +376,27 @@ async def generate_query_variations(
                 detail="Query command cannot be empty"
             )
         
-        variations = []
-        
         variation_prompts = [
             f"{request.command}",
             f"{request.command} (optimize for performance)",
             f"{request.command} (include relevant joins)"
         ]
         
-        for i, prompt in enumerate(variation_prompts):
-            try:
-                response = await service.process_query(
-                    command=prompt,
-                    include_sql=True
-                )
-                
-                if response.success and response.sql_query:
-                    variations.append({
-                        "variation": i + 1,
-                        "sql_query": response.sql_query,
-                        "prompt_hint": ["Basic query", "Performance optimized", "With joins"][i],
-                        "execution_time": response.execution_time
-                    })
-            except Exception as e:
-                logger.warning(f"Failed to generate variation {i + 1}: {str(e)}")
+        responses = await service.generate_sql_variations(request.command, variation_prompts)
+        
+        variations = []
+        for i, response in enumerate(responses):
+            if not response.success:
+                logger.warning(f"Failed to generate variation {i + 1}: {response.error}")
                 continue
+            
+            if response.sql_query:
+                variations.append({
+                    "variation": i + 1,
+                    "sql_query": response.sql_query,
+                    "prompt_hint": ["Basic query", "Performance optimized", "With joins"][i],
+                    "execution_time": response.execution_time
+                })
         
         if not variations:
             raise HTTPException(
@@ -0,0 +1,11 @@
+from pydantic import BaseModel, ConfigDict
+
+
+class SchemaModel(BaseModel):
+    """Base for API schemas: built on first use, unknown fields ignored, defaults not re-validated"""
+    
+    model_config = ConfigDict(
+        defer_build=True,
+        extra='ignore',
+        validate_default=False
+    )
@@ -1,44 +1,48 @@
 from typing import List, Any, Optional
-from pydantic import BaseModel, Field
+from pydantic import ConfigDict, Field
 
+from .base import SchemaModel
 
-class TableInfo(BaseModel):
+
+class TableInfo(SchemaModel):
     """Schema for table information"""
     table_names: List[str] = Field(..., description="List of available table names")
     schema_info: str = Field(..., description="Detailed schema information")
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "table_names": ["users", "projects", "attendance"],
                 "schema_info": "Table: users\nColumns: id, name, salary..."
             }
         }
+    )
 
 
-class TableSchema(BaseModel):
+class TableSchema(SchemaModel):
     """Schema for individual table description"""
     table_name: str = Field(..., description="Name of the table")
     schema: Any = Field(..., description="Table schema details")
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "table_name": "users",
                 "schema": "COLUMN_NAME | DATA_TYPE | IS_NULLABLE\nid | int | NO\nname | varchar | YES"
             }
         }
+    )
 
 
-class HealthStatus(BaseModel):
+class HealthStatus(SchemaModel):
     """Schema for health check response"""
     status: str = Field(..., description="Health status", pattern="^(healthy|unhealthy)$")
     database_connected: bool = Field(..., description="Database connection status")
     tables_count: Optional[int] = Field(None, description="Number of tables in database")
     error: Optional[str] = Field(None, description="Error message if unhealthy")
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "status": "healthy",
                 "database_connected": True,
@@ -46,19 +50,21 @@ class HealthStatus(BaseModel):
                 "error": None
             }
         }
+    )
 
 
-class QuickHealthStatus(BaseModel):
+class QuickHealthStatus(SchemaModel):
     """Schema for quick health check response"""
     status: str = Field(..., description="Health status", pattern="^(healthy|unhealthy)$")
     database_connected: bool = Field(..., description="Database connection status")
     error: Optional[str] = Field(None, description="Error message if unhealthy")
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "status": "healthy",
                 "database_connected": True,
                 "error": None
             }
-        }
\ No newline at end of file
+        }
+    )
\ No newline at end of file
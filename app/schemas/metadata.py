@@ -1,12 +1,14 @@
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field
+from pydantic import ConfigDict, Field
 
+from .base import SchemaModel
 
-class MetadataUploadRequest(BaseModel):
+
+class MetadataUploadRequest(SchemaModel):
     metadata: Dict[str, Any] = Field(..., description="Complete metadata JSON with tables and analysis")
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "metadata": {
                     "database_type": "Microsoft SQL Server",
@@ -41,9 +43,10 @@ class MetadataUploadRequest(BaseModel):
                 ]
             }
         }
+    )
 
 
-class MetadataUploadResponse(BaseModel):
+class MetadataUploadResponse(SchemaModel):
     success: bool = Field(..., description="Whether the upload was successful")
     processed_tables: Optional[int] = Field(None, description="Number of tables processed")
     total_tables: Optional[int] = Field(None, description="Total tables in metadata")
@@ -51,8 +54,8 @@ class MetadataUploadResponse(BaseModel):
     message: str = Field(..., description="Status message")
     error: Optional[str] = Field(None, description="Error message if failed")
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "success": True,
                 "processed_tables": 200,
@@ -62,9 +65,10 @@ class MetadataUploadResponse(BaseModel):
                 "error": None
             }
         }
+    )
 
 
-class BusinessLogicUploadResponse(BaseModel):
+class BusinessLogicUploadResponse(SchemaModel):
     success: bool = Field(..., description="Whether the upload was successful")
     processed_chunks: Optional[int] = Field(None, description="Number of chunks processed")
     total_chunks: Optional[int] = Field(None, description="Total chunks created")
@@ -72,8 +76,8 @@ class BusinessLogicUploadResponse(BaseModel):
     message: str = Field(..., description="Status message")
     error: Optional[str] = Field(None, description="Error message if failed")
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "success": True,
                 "processed_chunks": 15,
@@ -83,16 +87,17 @@ class BusinessLogicUploadResponse(BaseModel):
                 "error": None
             }
         }
+    )
 
 
-class KnowledgeBaseStatus(BaseModel):
+class KnowledgeBaseStatus(SchemaModel):
     metadata_loaded: bool = Field(..., description="Whether metadata is loaded")
     upload_time: Optional[str] = Field(None, description="Last upload time")
     total_tables: int = Field(..., description="Number of tables in knowledge base")
     index_built: bool = Field(..., description="Whether vector index is built")
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "metadata_loaded": True,
                 "upload_time": "2025-06-17T09:11:30.013073",
@@ -100,20 +105,22 @@ class KnowledgeBaseStatus(BaseModel):
                 "index_built": True
             }
         }
+    )
 
 
-class BusinessLogicStatus(BaseModel):
+class BusinessLogicStatus(SchemaModel):
     business_logic_loaded: bool = Field(..., description="Whether business logic is loaded")
     upload_time: Optional[str] = Field(None, description="Last upload time")
     total_chunks: int = Field(..., description="Number of business logic chunks")
     combined_with_schema: bool = Field(..., description="Whether combined with schema data")
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "business_logic_loaded": True,
                 "upload_time": "2025-06-17T09:11:30.013073",
                 "total_chunks": 15,
                 "combined_with_schema": True
             }
-        }
\ No newline at end of file
+        }
+    )
\ No newline at end of file
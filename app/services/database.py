@@ -1,7 +1,10 @@
 import time
 import logging
-from typing import List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import sqlglot
+from sqlglot import exp
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
 from langchain_community.utilities import SQLDatabase
 
 from ..config import settings
@@ -9,11 +12,27 @@ from ..core.exceptions import DatabaseConnectionError, QueryExecutionError, Sche
 
 logger = logging.getLogger(__name__)
 
+STREAM_BATCH_SIZE = 1000
+
+
+def is_select_query(sql_query: str) -> bool:
+    """Check that every statement in the SQL text is a query that only reads rows"""
+    try:
+        statements = [statement for statement in sqlglot.parse(sql_query, read="tsql") if statement is not None]
+    except sqlglot.errors.ParseError:
+        return False
+    
+    return bool(statements) and all(
+        isinstance(statement, exp.Query) and statement.find(exp.Into) is None
+        for statement in statements
+    )
+
 
 class DatabaseService:
     """Service for database operations with caching and connection management"""
     
     def __init__(self):
+        self.engine: Optional[Engine] = None
         self.db: Optional[SQLDatabase] = None
         self._table_names_cache: Optional[List[str]] = None
         self._table_info_cache: Optional[str] = None
@@ -36,7 +55,12 @@ class DatabaseService:
         for i, conn_str in enumerate(self.connection_strings):
             try:
                 logger.info(f"Attempting database connection {i + 1}/{len(self.connection_strings)}")
-                self.db = SQLDatabase.from_uri(conn_str)
+                self.engine = create_engine(
+                    conn_str,
+                    pool_size=settings.DB_POOL_SIZE,
+                    max_overflow=settings.DB_MAX_OVERFLOW
+                )
+                self.db = SQLDatabase(self.engine, lazy_table_reflection=True)
                 
                 # Test the connection
                 self.db.run("SELECT 1")
@@ -121,8 +145,8 @@ class DatabaseService:
             logger.error(f"Failed to get table info: {str(e)}")
             raise SchemaRetrievalError(f"Failed to retrieve table information: {str(e)}")
     
-    def describe_table(self, table_name: str) -> str:
-        """Get detailed description of a specific table"""
+    def describe_table(self, table_name: str) -> List[Tuple[Any, ...]]:
+        """Get column rows (name, type, nullable, default, max length) for a specific table"""
         try:
             self._ensure_connection()
             
@@ -130,7 +154,7 @@ class DatabaseService:
             if not table_name.replace('_', '').replace(' ', '').replace('$', '').isalnum():
                 raise ValueError("Invalid table name")
             
-            schema_query = f"""
+            schema_query = """
             SELECT 
                 COLUMN_NAME,
                 DATA_TYPE,
@@ -138,18 +162,18 @@ class DatabaseService:
                 COLUMN_DEFAULT,
                 CHARACTER_MAXIMUM_LENGTH
             FROM INFORMATION_SCHEMA.COLUMNS 
-            WHERE TABLE_NAME = '{table_name}'
+            WHERE TABLE_NAME = :table_name
             ORDER BY ORDINAL_POSITION
             """
             
-            return self.execute_sql(schema_query)
+            return self.execute_sql_rows(schema_query, {"table_name": table_name})
             
         except Exception as e:
             logger.error(f"Failed to describe table {table_name}: {str(e)}")
             raise SchemaRetrievalError(f"Failed to describe table {table_name}: {str(e)}")
     
     def execute_sql(self, sql_query: str) -> str:
-        """Execute SQL query with error handling"""
+        """Execute SQL query and return the stringified result (for LLM prompts only)"""
         try:
             self._ensure_connection()
             
@@ -167,6 +191,54 @@ class DatabaseService:
             logger.error(f"SQL execution failed: {str(e)}")
             raise QueryExecutionError(f"Failed to execute SQL query: {str(e)}")
     
+    def execute_sql_rows(self, sql_query: str, params: Optional[dict] = None) -> List[Tuple[Any, ...]]:
+        """Execute SQL query on the raw engine and return result rows as tuples"""
+        try:
+            self._ensure_connection()
+            
+            logger.debug(f"Executing SQL query for rows: {sql_query[:100]}...")
+            start_time = time.time()
+            
+            with self.engine.connect() as connection:
+                result = connection.execute(text(sql_query), params or {})
+                rows = [tuple(row) for row in result.fetchall()] if result.returns_rows else []
+            
+            execution_time = time.time() - start_time
+            logger.debug(f"Query returned {len(rows)} rows in {execution_time:.3f} seconds")
+            
+            return rows
+            
+        except Exception as e:
+            logger.error(f"SQL execution failed: {str(e)}")
+            raise QueryExecutionError(f"Failed to execute SQL query: {str(e)}")
+    
+    def stream_sql_rows(self, sql_query: str, batch_size: int = STREAM_BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+        """Execute a SELECT query with a server-side cursor and yield result rows in batches of dicts"""
+        # The connection is never committed, so any other statement would be rolled back unnoticed
+        if not is_select_query(sql_query):
+            raise QueryExecutionError("Only SELECT queries can be streamed")
+        
+        try:
+            self._ensure_connection()
+            
+            logger.debug(f"Streaming SQL query: {sql_query[:100]}...")
+            
+            with self.engine.connect().execution_options(stream_results=True) as connection:
+                result = connection.execute(text(sql_query))
+                if not result.returns_rows:
+                    return
+                
+                mappings = result.mappings()
+                while True:
+                    rows = mappings.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield [dict(row) for row in rows]
+            
+        except Exception as e:
+            logger.error(f"SQL streaming failed: {str(e)}")
+            raise QueryExecutionError(f"Failed to execute SQL query: {str(e)}")
+    
     def get_connection_status(self) -> dict:
         """Get detailed connection status"""
         return {
@@ -0,0 +1,178 @@
+import re
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+from ..schemas.query import QueryResponse
+
+# Paraphrases that differ only in a number ("top 5" vs "top 10") embed almost identically
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+# A number from the command only counts as a SQL parameter when it stands alone, not inside an identifier or date
+_SQL_NUMBER_TEMPLATE = r"(?<![\w.\-]){}(?![\w.\-])"
+# Single quotes only delimit a literal at word edges, so apostrophes ("customer's") are not quotes
+_QUOTED_RE = re.compile(r'"([^"]+)"|(?<!\w)\'([^\']+)\'(?!\w)')
+_WORD_RE = re.compile(r"[^\W\d_]+")
+# Words that change which rows a query selects while barely moving its embedding ("March" vs "April")
+_FILTER_WORDS = frozenset("""
+    january february march april may june july august september october november december
+    jan feb mar apr jun jul aug sep sept oct nov dec
+    monday tuesday wednesday thursday friday saturday sunday
+    today yesterday tomorrow tonight last this next previous current past
+    day days daily week weeks weekly month months monthly quarter quarters quarterly year years yearly annual
+    greater less more fewer above below over under higher lower before after between
+    top bottom highest lowest most least max min maximum minimum ascending descending asc desc
+    not no without except never
+""".split())
+
+
+def literal_signature(command: str) -> Tuple[str, ...]:
+    """Numbers, quoted strings, proper nouns and filter words of a command; similar commands must share them"""
+    quoted = [(double or single).lower() for double, single in _QUOTED_RE.findall(command)]
+    unquoted = _QUOTED_RE.sub(" ", command)
+    
+    words = []
+    for position, word in enumerate(_WORD_RE.findall(unquoted)):
+        # Capitalized words after the first are names ("Smith", "IT"); the pronoun I is not
+        if word.lower() in _FILTER_WORDS or (position and word[0].isupper() and word != "I"):
+            words.append(word.lower())
+    
+    return (*_NUMBER_RE.findall(unquoted), *quoted, *words)
+
+
+class SemanticQueryCache:
+    """Cache of successful query responses, matched by exact normalized text and then by embedding similarity"""
+
+    def __init__(self, max_entries: int, similarity_threshold: float, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, QueryResponse, float, Tuple[str, ...]]]" = OrderedDict()
+        self._fingerprint: Any = None
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: list = []
+        self._templates: "OrderedDict[str, Tuple[str, List[Tuple[int, int]], float]]" = OrderedDict()
+
+    @staticmethod
+    def normalize(command: str) -> str:
+        return " ".join(command.lower().split())
+
+    @staticmethod
+    def template_key(key: str) -> str:
+        return _NUMBER_RE.sub("#", key)
+
+    def _sync(self, fingerprint: Any) -> None:
+        """Drop every entry when the knowledge base changed, and expired entries otherwise"""
+        if fingerprint != self._fingerprint:
+            self._entries.clear()
+            self._templates.clear()
+            self._fingerprint = fingerprint
+            self._matrix = None
+            return
+        
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [key for key, (_, _, stored_at, _) in self._entries.items() if stored_at < cutoff]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+        
+        for key in [key for key, (_, _, stored_at) in self._templates.items() if stored_at < cutoff]:
+            del self._templates[key]
+
+    def get_exact(self, key: str, fingerprint: Any) -> Optional[QueryResponse]:
+        self._sync(fingerprint)
+        
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def get_template(self, key: str, fingerprint: Any) -> Optional[str]:
+        """SQL of a cached command that differed only in its numbers, with the new numbers substituted"""
+        self._sync(fingerprint)
+        
+        numbers = _NUMBER_RE.findall(key)
+        if not numbers:
+            return None
+        
+        entry = self._templates.get(self.template_key(key))
+        if entry is None:
+            return None
+        
+        self._templates.move_to_end(self.template_key(key))
+        sql_query, spans, _ = entry
+        parts = []
+        position = 0
+        for number, (start, end) in sorted(zip(numbers, spans), key=lambda pair: pair[1][0]):
+            parts.append(sql_query[position:start])
+            parts.append(number)
+            position = end
+        parts.append(sql_query[position:])
+        return "".join(parts)
+
+    def _learn_template(self, key: str, sql_query: str) -> None:
+        """Remember where each number of the command appears in its SQL, when that mapping is unambiguous"""
+        numbers = _NUMBER_RE.findall(key)
+        if not numbers or len(set(numbers)) != len(numbers):
+            return
+        
+        spans = []
+        for number in numbers:
+            matches = list(re.finditer(_SQL_NUMBER_TEMPLATE.format(re.escape(number)), sql_query))
+            if len(matches) != 1:
+                return
+            spans.append(matches[0].span())
+        
+        template_key = self.template_key(key)
+        self._templates[template_key] = (sql_query, spans, time.monotonic())
+        self._templates.move_to_end(template_key)
+        if len(self._templates) > self.max_entries:
+            self._templates.popitem(last=False)
+
+    def get_similar(self, command: str, vector: np.ndarray, fingerprint: Any) -> Optional[QueryResponse]:
+        """Response of the closest cached command, if it is similar enough and has the same literal signature"""
+        self._sync(fingerprint)
+        if not self._entries:
+            return None
+        
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries)
+            self._matrix = np.vstack([self._entries[cached_key][0] for cached_key in self._matrix_keys])
+        
+        # Stored and query vectors are L2-normalized, so the dot product is the cosine similarity
+        scores = self._matrix @ vector.reshape(-1)
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        
+        cached_key = self._matrix_keys[best]
+        # Names, dates and numbers barely move the embedding but change the SQL ("customer Smith" vs "Jones")
+        if self._entries[cached_key][3] != literal_signature(command):
+            return None
+        
+        self._entries.move_to_end(cached_key)
+        return self._entries[cached_key][1]
+
+    def put(self, key: str, vector: np.ndarray, fingerprint: Any, response: QueryResponse) -> None:
+        # A response generated against a knowledge base that has since changed is not cached
+        if fingerprint != self._fingerprint:
+            return
+        
+        self._entries[key] = (vector.reshape(-1), response, time.monotonic(), literal_signature(response.command or key))
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._matrix = None
+        
+        if response.sql_query:
+            self._learn_template(key, response.sql_query)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._templates.clear()
+        self._matrix = None
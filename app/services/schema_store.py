@@ -1,47 +1,258 @@
-import json
+import asyncio
+import hashlib
 import logging
 import pickle
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, wraps
 from typing import List, Tuple, Dict, Any, Optional
 from datetime import datetime
 from pathlib import Path
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
+import orjson
+import torch
+from sentence_transformers import CrossEncoder, SentenceTransformer
 import faiss
 
 from .database import DatabaseService
+from ..config import settings
 
 logger = logging.getLogger(__name__)
 
+EMBEDDING_CHUNK_SIZE = 4096
+EMBEDDING_MAX_SEQ_LENGTH = 256
+
+# Stored embeddings are half precision; they are widened to float32 whenever an index is built
+EMBEDDING_STORAGE_DTYPE = np.float16
+
+# Below this corpus size an exhaustive inner-product scan beats building an HNSW graph
+HNSW_MIN_VECTORS = 1000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 32
+# Larger k needs a wider beam to keep recall; efSearch is raised per query to this multiple of k
+HNSW_EF_PER_RESULT = 4
+
+# Larger corpora store 8-bit quantized vectors, very large ones switch to IVF-PQ
+SQ8_MIN_VECTORS = 5000
+IVFPQ_MIN_VECTORS = 100000
+IVF_NPROBE = 16
+
+QUERY_EMBEDDING_CACHE_SIZE = 2048
+SEARCH_RESULT_CACHE_SIZE = 1024
+SCHEMA_SUMMARY_LENGTH = 500
+
+# Concurrent searches wait up to this long so their query embeddings share one encode call
+QUERY_BATCH_WINDOW_SECONDS = 0.005
+QUERY_BATCH_SIZE = 16
+
+_PARAGRAPH_BREAK_RE = re.compile(r"\n{2,}")
+
+EMBEDDING_DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+
+if EMBEDDING_DEVICE == "cpu":
+    torch.set_num_threads(settings.TORCH_NUM_THREADS or os.cpu_count() or 1)
+    try:
+        # Encodes are issued one at a time; inter-op parallelism only adds thread contention
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        logger.debug("torch inter-op thread count already fixed for this process")
+
+
+def _serialized(method):
+    """Run a corpus-changing store method under the store's write lock
+
+    Searches do not take this lock. Writers publish a new corpus under the short swap lock with
+    index_version bumped last, and readers snapshot it under the same lock.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._write_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _write_file_atomically(path: Path, data: bytes) -> None:
+    """Write to a sibling temp file and rename it over the target, so readers never see a partial file"""
+    tmp_file = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_file, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_file, path)
+
+
+def _onnx_model_file() -> str:
+    """Pick the quantized ONNX export when the CPU has AVX512-VNNI, else the optimized fp32 graph"""
+    if settings.EMBEDDING_ONNX_FILE:
+        return settings.EMBEDDING_ONNX_FILE
+    
+    try:
+        cpu_flags = Path("/proc/cpuinfo").read_text()
+    except OSError:
+        cpu_flags = ""
+    
+    return "onnx/model_qint8_avx512_vnni.onnx" if "avx512_vnni" in cpu_flags else "onnx/model_O3.onnx"
+
+
+@lru_cache(maxsize=4)
+def _get_st_model(model_name: str) -> SentenceTransformer:
+    """Load an embedding model once per process and share it between stores"""
+    # Quantized ONNX graphs are a CPU optimization; on GPU the torch backend is faster
+    backend = settings.EMBEDDING_BACKEND or ("torch" if EMBEDDING_DEVICE == "cuda" else "onnx")
+    model_kwargs = {"file_name": _onnx_model_file()} if backend == "onnx" else None
+    
+    logger.info(f"Loading embedding model {model_name} ({backend} backend) on {EMBEDDING_DEVICE}")
+    model = SentenceTransformer(model_name, device=EMBEDDING_DEVICE, backend=backend, model_kwargs=model_kwargs)
+    # Schema and business logic texts are short; avoid padding batches out to 512 tokens
+    model.max_seq_length = min(model.max_seq_length or EMBEDDING_MAX_SEQ_LENGTH, EMBEDDING_MAX_SEQ_LENGTH)
+    return model
+
+
+@lru_cache(maxsize=2)
+def _get_cross_encoder(model_name: str) -> CrossEncoder:
+    """Load a reranking model once per process"""
+    logger.info(f"Loading reranker model {model_name} on {EMBEDDING_DEVICE}")
+    return CrossEncoder(model_name, max_length=EMBEDDING_MAX_SEQ_LENGTH, device=EMBEDDING_DEVICE)
+
+
+def _format_column(col: Dict[str, Any]) -> str:
+    not_null = "" if col.get('nullable', True) else ", NOT NULL"
+    auto_increment = ", AUTO_INCREMENT" if col.get('autoincrement') else ""
+    return f"{col['name']} ({col['type']}{not_null}{auto_increment})"
+
+
+def _format_foreign_key(fk: Any) -> str:
+    if isinstance(fk, dict):
+        return f"{fk.get('column', '')} -> {fk.get('referenced_table', '')}.{fk.get('referenced_column', '')}"
+    return str(fk)
+
+
+def _format_relationship(rel: Any) -> str:
+    if isinstance(rel, dict):
+        return f"Related to {rel.get('table', '')} via {rel.get('relationship_type', '')}"
+    return str(rel)
+
+
+def _enriched_text_lines(table_name: str, schema_info: Dict[str, Any], llm_analysis: Dict[str, Any]):
+    """Yield the lines of a table's searchable description, one per populated section"""
+    yield f"Table: {table_name}"
+    
+    if "columns" in schema_info:
+        yield "Columns: " + ", ".join(map(_format_column, schema_info["columns"]))
+    
+    if schema_info.get("primary_keys"):
+        yield "Primary Keys: " + ", ".join(schema_info["primary_keys"])
+    
+    if schema_info.get("foreign_keys"):
+        yield "Foreign Keys: " + ", ".join(map(_format_foreign_key, schema_info["foreign_keys"]))
+    
+    if llm_analysis.get("purpose"):
+        yield "Purpose: " + llm_analysis["purpose"]
+    
+    if llm_analysis.get("data_patterns"):
+        yield "Data Patterns: " + "; ".join(llm_analysis["data_patterns"])
+    
+    if llm_analysis.get("relationships"):
+        yield "Relationships: " + "; ".join(map(_format_relationship, llm_analysis["relationships"]))
+    
+    if llm_analysis.get("observations"):
+        yield "Observations: " + "; ".join(llm_analysis["observations"])
+    
+    if schema_info.get("sample_data"):
+        sample_keys = dict.fromkeys(
+            key
+            for sample in schema_info["sample_data"][:3] if isinstance(sample, dict)
+            for key in sample
+        )
+        if sample_keys:
+            yield "Sample Data Fields: " + ", ".join(sample_keys)
+
 
 class PersistentEnhancedSchemaVectorStore:
 
     def __init__(self, database_service: DatabaseService, model_name: str = "all-MiniLM-L6-v2", storage_path: str = "knowledge_base"):
         self.database_service = database_service
-        self.model = SentenceTransformer(model_name)
+        self._model_name = model_name
         self.storage_path = Path(storage_path)
         self.storage_path.mkdir(exist_ok=True)
         
-        self.index = None
+        # The FAISS index and embedding matrix are read from disk on first use
+        self._index: Optional[faiss.Index] = None
+        self._embeddings: Optional[np.ndarray] = None
+        self._vectors_on_disk = False
+        self._index_mmapped = False
+        # Uploads, rebuilds and clears run in worker threads; they must not interleave
+        self._write_lock = threading.RLock()
+        # Held only while a new corpus is swapped in or a reader takes its snapshot of it
+        self._swap_lock = threading.RLock()
         self.schema_texts: List[str] = []
         self.table_names: List[str] = []
         self.table_metadata: Dict[str, Dict[str, Any]] = {}
         
         self.business_logic_texts: List[str] = []
         self.business_logic_metadata: List[Dict[str, Any]] = []
+        self._business_logic_by_id: Dict[str, Dict[str, Any]] = {}
         
         self.combined_texts: List[str] = []
         self.text_types: List[str] = []
         self.text_identifiers: List[str] = []
+        # Leading combined-text rows already written to the JSONL file
+        self._logged_text_rows = 0
         
         self.is_metadata_loaded = False
         self.is_business_logic_loaded = False
         self.metadata_upload_time: Optional[datetime] = None
+        self.metadata_hash: Optional[str] = None
         self.business_logic_upload_time: Optional[datetime] = None
         
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._pending_queries: List[Tuple[str, asyncio.Future]] = []
+        self._query_batch_task: Optional[asyncio.Task] = None
+        
+        # Bumped whenever the indexed corpus changes so dependent caches can invalidate
+        self.index_version = 0
+        # Keys include index_version, so entries for an older corpus simply age out
+        self._search_cache: "OrderedDict[Tuple[str, int, int], Tuple[float, list]]" = OrderedDict()
+        self._result_summaries: Dict[str, Dict[str, Any]] = {}
+        self._result_summaries_version: Optional[int] = None
+        
         self._load_from_disk()
 
+    @property
+    def model(self) -> SentenceTransformer:
+        return _get_st_model(self._model_name)
+
+    def _ensure_vectors_loaded(self) -> None:
+        if self._vectors_on_disk:
+            with self._swap_lock:
+                if self._vectors_on_disk:
+                    self._load_vectors_from_disk()
+
+    @property
+    def index(self) -> Optional[faiss.Index]:
+        self._ensure_vectors_loaded()
+        return self._index
+
+    @index.setter
+    def index(self, value: Optional[faiss.Index]) -> None:
+        self._ensure_vectors_loaded()
+        self._index = value
+        self._index_mmapped = False
+
+    @property
+    def embeddings(self) -> Optional[np.ndarray]:
+        self._ensure_vectors_loaded()
+        return self._embeddings
+
+    @embeddings.setter
+    def embeddings(self, value: Optional[np.ndarray]) -> None:
+        self._ensure_vectors_loaded()
+        self._embeddings = value
+
     def _get_metadata_file(self) -> Path:
         return self.storage_path / "metadata.json"
 
@@ -52,8 +263,14 @@ class PersistentEnhancedSchemaVectorStore:
         return self.storage_path / "vector_index.faiss"
 
     def _get_combined_texts_file(self) -> Path:
+        return self.storage_path / "combined_texts.jsonl"
+
+    def _get_legacy_combined_texts_file(self) -> Path:
         return self.storage_path / "combined_texts.pkl"
 
+    def _get_embeddings_file(self) -> Path:
+        return self.storage_path / "embeddings.npy"
+
     def _get_text_metadata_file(self) -> Path:
         return self.storage_path / "text_metadata.pkl"
 
@@ -62,11 +279,11 @@ class PersistentEnhancedSchemaVectorStore:
             metadata_to_save = {
                 "table_metadata": self.table_metadata,
                 "is_metadata_loaded": self.is_metadata_loaded,
-                "metadata_upload_time": self.metadata_upload_time.isoformat() if self.metadata_upload_time else None
+                "metadata_upload_time": self.metadata_upload_time.isoformat() if self.metadata_upload_time else None,
+                "metadata_hash": self.metadata_hash
             }
             
-            with open(self._get_metadata_file(), 'w', encoding='utf-8') as f:
-                json.dump(metadata_to_save, f, indent=2, ensure_ascii=False)
+            _write_file_atomically(self._get_metadata_file(), orjson.dumps(metadata_to_save, option=orjson.OPT_NON_STR_KEYS))
             
             business_logic_to_save = {
                 "business_logic_texts": self.business_logic_texts,
@@ -75,22 +292,24 @@ class PersistentEnhancedSchemaVectorStore:
                 "business_logic_upload_time": self.business_logic_upload_time.isoformat() if self.business_logic_upload_time else None
             }
             
-            with open(self._get_business_logic_file(), 'w', encoding='utf-8') as f:
-                json.dump(business_logic_to_save, f, indent=2, ensure_ascii=False)
-            
-            combined_data = {
-                "combined_texts": self.combined_texts,
-                "text_types": self.text_types,
-                "text_identifiers": self.text_identifiers,
-                "schema_texts": self.schema_texts,
-                "table_names": self.table_names
-            }
+            _write_file_atomically(self._get_business_logic_file(), orjson.dumps(business_logic_to_save, option=orjson.OPT_NON_STR_KEYS))
             
-            with open(self._get_combined_texts_file(), 'wb') as f:
-                pickle.dump(combined_data, f)
+            self._save_combined_texts()
             
-            if self.index is not None:
-                faiss.write_index(self.index, str(self._get_index_file()))
+            # Vectors still pending a lazy load, or memory-mapped from the file, are already on disk
+            if not self._vectors_on_disk:
+                if self._index is not None and not self._index_mmapped:
+                    index_file = self._get_index_file()
+                    tmp_file = index_file.with_suffix(index_file.suffix + ".tmp")
+                    faiss.write_index(self._index, str(tmp_file))
+                    os.replace(tmp_file, index_file)
+                
+                if self._embeddings is not None and not isinstance(self._embeddings, np.memmap):
+                    embeddings_file = self._get_embeddings_file()
+                    tmp_file = embeddings_file.with_suffix(embeddings_file.suffix + ".tmp")
+                    with open(tmp_file, 'wb') as f:
+                        np.save(f, self._embeddings.astype(EMBEDDING_STORAGE_DTYPE, copy=False))
+                    os.replace(tmp_file, embeddings_file)
             
             logger.info("Knowledge base saved to disk successfully")
             
@@ -101,11 +320,12 @@ class PersistentEnhancedSchemaVectorStore:
         try:
             metadata_file = self._get_metadata_file()
             if metadata_file.exists():
-                with open(metadata_file, 'r', encoding='utf-8') as f:
-                    saved_data = json.load(f)
+                with open(metadata_file, 'rb') as f:
+                    saved_data = orjson.loads(f.read())
                 
                 self.table_metadata = saved_data.get("table_metadata", {})
                 self.is_metadata_loaded = saved_data.get("is_metadata_loaded", False)
+                self.metadata_hash = saved_data.get("metadata_hash")
                 
                 upload_time_str = saved_data.get("metadata_upload_time")
                 if upload_time_str:
@@ -113,11 +333,12 @@ class PersistentEnhancedSchemaVectorStore:
             
             business_logic_file = self._get_business_logic_file()
             if business_logic_file.exists():
-                with open(business_logic_file, 'r', encoding='utf-8') as f:
-                    business_data = json.load(f)
+                with open(business_logic_file, 'rb') as f:
+                    business_data = orjson.loads(f.read())
                 
                 self.business_logic_texts = business_data.get("business_logic_texts", [])
                 self.business_logic_metadata = business_data.get("business_logic_metadata", [])
+                self._business_logic_by_id = {meta["chunk_id"]: meta for meta in self.business_logic_metadata}
                 self.is_business_logic_loaded = business_data.get("is_business_logic_loaded", False)
                 
                 upload_time_str = business_data.get("business_logic_upload_time")
@@ -125,8 +346,11 @@ class PersistentEnhancedSchemaVectorStore:
                     self.business_logic_upload_time = datetime.fromisoformat(upload_time_str)
             
             combined_file = self._get_combined_texts_file()
+            legacy_combined_file = self._get_legacy_combined_texts_file()
             if combined_file.exists():
-                with open(combined_file, 'rb') as f:
+                self._load_combined_texts()
+            elif legacy_combined_file.exists():
+                with open(legacy_combined_file, 'rb') as f:
                     combined_data = pickle.load(f)
                 
                 self.combined_texts = combined_data.get("combined_texts", [])
@@ -135,9 +359,7 @@ class PersistentEnhancedSchemaVectorStore:
                 self.schema_texts = combined_data.get("schema_texts", [])
                 self.table_names = combined_data.get("table_names", [])
             
-            index_file = self._get_index_file()
-            if index_file.exists():
-                self.index = faiss.read_index(str(index_file))
+            self._vectors_on_disk = self._get_index_file().exists() or self._get_embeddings_file().exists()
             
             if self.is_metadata_loaded or self.is_business_logic_loaded:
                 logger.info(f"Knowledge base loaded from disk: {len(self.table_names)} tables, {len(self.business_logic_texts)} business logic entries")
@@ -146,21 +368,121 @@ class PersistentEnhancedSchemaVectorStore:
             logger.warning(f"Failed to load knowledge base from disk: {e}")
             self._reset_state()
 
+    def _save_combined_texts(self) -> None:
+        """Persist combined texts as JSONL, appending only rows the file does not hold yet"""
+        combined_file = self._get_combined_texts_file()
+        logged_rows = self._logged_text_rows if combined_file.exists() else 0
+        
+        rows = zip(
+            self.combined_texts[logged_rows:],
+            self.text_types[logged_rows:],
+            self.text_identifiers[logged_rows:]
+        )
+        lines = b"".join(
+            orjson.dumps({"text": text, "type": text_type, "id": identifier}) + b"\n"
+            for text, text_type, identifier in rows
+        )
+        
+        if logged_rows:
+            with open(combined_file, 'ab') as f:
+                f.write(lines)
+        else:
+            _write_file_atomically(combined_file, lines)
+        
+        self._logged_text_rows = len(self.combined_texts)
+
+    def _load_combined_texts(self) -> None:
+        self.combined_texts = []
+        self.text_types = []
+        self.text_identifiers = []
+        
+        combined_file = self._get_combined_texts_file()
+        with open(combined_file, 'rb') as f:
+            lines = f.read().splitlines(keepends=True)
+        
+        valid_bytes = 0
+        for line_number, line in enumerate(lines, start=1):
+            try:
+                row = orjson.loads(line)
+                text, text_type, identifier = row["text"], row["type"], row["id"]
+            except (orjson.JSONDecodeError, KeyError, TypeError):
+                if line_number < len(lines):
+                    raise
+                # A crash mid-append leaves a partial last row; drop it so the next append starts on a clean line
+                logger.warning(f"Discarding unreadable trailing row {line_number} of {combined_file.name}")
+                with open(combined_file, 'r+b') as f:
+                    f.truncate(valid_bytes)
+                break
+            
+            self.combined_texts.append(text)
+            self.text_types.append(text_type)
+            self.text_identifiers.append(identifier)
+            valid_bytes += len(line)
+        else:
+            if lines and not lines[-1].endswith(b"\n"):
+                with open(combined_file, 'ab') as f:
+                    f.write(b"\n")
+        
+        self.schema_texts = [text for text, text_type in zip(self.combined_texts, self.text_types) if text_type == "schema"]
+        self.table_names = [identifier for identifier, text_type in zip(self.text_identifiers, self.text_types) if text_type == "schema"]
+        self._logged_text_rows = len(self.combined_texts)
+
+    def _load_vectors_from_disk(self) -> None:
+        """Load the stored embeddings and FAISS index, rebuilding the index from embeddings if it is missing"""
+        try:
+            embeddings_file = self._get_embeddings_file()
+            if embeddings_file.exists():
+                self._embeddings = np.load(embeddings_file, mmap_mode="r")
+            
+            index_file = self._get_index_file()
+            if index_file.exists():
+                # IVF-PQ inverted lists can be served straight from the page cache; other index types must load
+                if self._index_tier(len(self.combined_texts)) == "ivfpq":
+                    self._index = faiss.read_index(str(index_file), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                    self._index_mmapped = True
+                else:
+                    self._index = faiss.read_index(str(index_file))
+                self._apply_search_params(self._index)
+            elif self._embeddings is not None and len(self._embeddings) == len(self.combined_texts):
+                logger.info("Vector index missing, rebuilding from stored embeddings")
+                self._index = self._build_index(np.array(self._embeddings, dtype=np.float32))
+            
+        except Exception as e:
+            logger.warning(f"Failed to load vector index from disk: {e}")
+            self._index = None
+            self._embeddings = None
+            self._index_mmapped = False
+        finally:
+            # Cleared last, so a reader outside the lock never finds the flag cleared and the vectors missing
+            self._vectors_on_disk = False
+
     def _reset_state(self) -> None:
-        self.index = None
+        with self._swap_lock:
+            self._clear_fields()
+            self.index_version += 1
+
+    def _clear_fields(self) -> None:
+        self._index = None
+        self._embeddings = None
+        self._vectors_on_disk = False
+        self._index_mmapped = False
         self.schema_texts = []
         self.table_names = []
         self.table_metadata = {}
         self.business_logic_texts = []
         self.business_logic_metadata = []
+        self._business_logic_by_id = {}
         self.combined_texts = []
         self.text_types = []
         self.text_identifiers = []
+        self._logged_text_rows = 0
         self.is_metadata_loaded = False
         self.is_business_logic_loaded = False
         self.metadata_upload_time = None
+        self.metadata_hash = None
         self.business_logic_upload_time = None
 
+    @_serialized
     def process_business_logic_file(self, file_content: str, file_name: str = "business_logic.txt") -> Dict[str, Any]:
         try:
             logger.info(f"Processing business logic file: {file_name}")
@@ -222,26 +544,30 @@ class PersistentEnhancedSchemaVectorStore:
     def _split_business_logic_content(self, content: str) -> List[str]:
         chunks = []
         
-        paragraphs = [p.strip() for p in content.split('\n\n') if p.strip()]
-        
-        for paragraph in paragraphs:
+        for paragraph in _PARAGRAPH_BREAK_RE.split(content):
+            paragraph = paragraph.strip()
             if len(paragraph) < 50:
                 continue
             
             if len(paragraph) > 1000:
-                sentences = [s.strip() for s in paragraph.split('.') if s.strip()]
-                current_chunk = ""
+                current_parts = []
+                current_len = 0
                 
-                for sentence in sentences:
-                    if len(current_chunk + sentence) < 800:
-                        current_chunk += sentence + ". "
-                    else:
-                        if current_chunk:
-                            chunks.append(current_chunk.strip())
-                        current_chunk = sentence + ". "
+                for sentence in paragraph.split('.'):
+                    sentence = sentence.strip()
+                    if not sentence:
+                        continue
+                    
+                    if current_len + len(sentence) >= 800 and current_parts:
+                        chunks.append(". ".join(current_parts) + ".")
+                        current_parts = []
+                        current_len = 0
+                    
+                    current_parts.append(sentence)
+                    current_len += len(sentence) + 2
                 
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
+                if current_parts:
+                    chunks.append(". ".join(current_parts) + ".")
             else:
                 chunks.append(paragraph)
         
@@ -258,37 +584,170 @@ class PersistentEnhancedSchemaVectorStore:
         
         return chunks
 
-    def _rebuild_combined_index(self) -> None:
+    def _rebuild_combined_index(self, force: bool = False, table_metadata: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+        """Build the new corpus and index off to the side, then swap them in; searches never see a half-built state"""
         logger.info("Rebuilding combined vector index...")
         
-        self.combined_texts = []
-        self.text_types = []
-        self.text_identifiers = []
+        previous_texts = self.combined_texts
+        previous_identifiers = self.text_identifiers
+        previous_embeddings = self.embeddings
+        if previous_embeddings is not None and len(previous_embeddings) != len(previous_texts):
+            previous_embeddings = None
+        
+        combined_texts = list(self.schema_texts)
+        text_types = ["schema"] * len(combined_texts)
+        text_identifiers = list(self.table_names)
         
-        for i, (table_name, schema_text) in enumerate(zip(self.table_names, self.schema_texts)):
-            self.combined_texts.append(schema_text)
-            self.text_types.append("schema")
-            self.text_identifiers.append(table_name)
+        business_logic_by_id = {meta["chunk_id"]: meta for meta in self.business_logic_metadata}
         
-        for i, (business_text, metadata) in enumerate(zip(self.business_logic_texts, self.business_logic_metadata)):
-            enhanced_business_text = f"Business Logic: {business_text}"
-            self.combined_texts.append(enhanced_business_text)
-            self.text_types.append("business_logic")
-            self.text_identifiers.append(metadata["chunk_id"])
+        for business_text, metadata in zip(self.business_logic_texts, self.business_logic_metadata):
+            combined_texts.append(f"Business Logic: {business_text}")
+            text_types.append("business_logic")
+            text_identifiers.append(metadata["chunk_id"])
         
-        if not self.combined_texts:
+        logged_rows = self._logged_text_rows
+        if (combined_texts[:logged_rows] != previous_texts[:logged_rows]
+                or text_identifiers[:logged_rows] != previous_identifiers[:logged_rows]):
+            logged_rows = 0
+        
+        index = self.index
+        embeddings = self.embeddings
+        if not combined_texts:
             logger.warning("No texts available for combined index")
-            return
+        elif not force and previous_embeddings is not None and self._can_append(previous_texts, combined_texts):
+            new_texts = combined_texts[len(previous_texts):]
+            if new_texts:
+                logger.info(f"Appending {len(new_texts)} new texts to the existing vector index...")
+                new_embeddings = self._encode_texts(new_texts)
+                # FAISS does not allow adding to an index while it is searched, so the copy is extended and swapped in
+                index = faiss.clone_index(index)
+                self._apply_search_params(index)
+                index.add(new_embeddings)
+                embeddings = np.vstack([previous_embeddings, new_embeddings])
+            
+            logger.info(f"Combined vector index up to date with {len(combined_texts)} texts")
+        else:
+            embeddings = self._reuse_or_encode(previous_texts, previous_embeddings, combined_texts)
+            index = self._build_index(embeddings)
+            logger.info(f"Combined vector index rebuilt with {len(combined_texts)} texts")
+        
+        with self._swap_lock:
+            if index is not self._index:
+                self._index = index
+                self._index_mmapped = False
+            self._embeddings = embeddings
+            self.combined_texts = combined_texts
+            self.text_types = text_types
+            self.text_identifiers = text_identifiers
+            self._business_logic_by_id = business_logic_by_id
+            if table_metadata is not None:
+                self.table_metadata = table_metadata
+            self._logged_text_rows = logged_rows
+            # Bumped last, so a search keyed by the new version always reads the new corpus
+            self.index_version += 1
+
+    def _can_append(self, previous_texts: List[str], combined_texts: List[str]) -> bool:
+        """Check whether the new corpus only appends to the indexed one"""
+        if self.index is None or self.index.ntotal != len(previous_texts):
+            return False
+        if self._index_mmapped:
+            return False
+        if self.index.metric_type != faiss.METRIC_INNER_PRODUCT:
+            return False
+        if self._index_tier(len(previous_texts)) != self._index_tier(len(combined_texts)):
+            return False
+        return combined_texts[:len(previous_texts)] == previous_texts
+
+    def _reuse_or_encode(self, previous_texts: List[str], previous_embeddings: Optional[np.ndarray], combined_texts: List[str]) -> np.ndarray:
+        """Assemble the embedding matrix, encoding only texts without a stored vector"""
+        if previous_embeddings is None:
+            logger.info(f"Creating embeddings for {len(combined_texts)} texts (schema + business logic)...")
+            return self._encode_texts(combined_texts)
+        
+        previous_rows = {text: row for row, text in enumerate(previous_texts)}
+        missing = [i for i, text in enumerate(combined_texts) if text not in previous_rows]
         
-        logger.info(f"Creating embeddings for {len(self.combined_texts)} texts (schema + business logic)...")
-        embeddings = self.model.encode(self.combined_texts)
-        dim = embeddings.shape[1]
+        logger.info(f"Creating embeddings for {len(missing)} of {len(combined_texts)} texts (schema + business logic)...")
+        embeddings = np.empty((len(combined_texts), previous_embeddings.shape[1]), dtype=np.float32)
+        for i, text in enumerate(combined_texts):
+            row = previous_rows.get(text)
+            if row is not None:
+                embeddings[i] = previous_embeddings[row]
         
-        self.index = faiss.IndexFlatL2(dim)
-        self.index.add(np.array(embeddings, dtype="float32"))
+        if missing:
+            embeddings[missing] = self._encode_texts([combined_texts[i] for i in missing])
         
-        logger.info(f"Combined vector index rebuilt with {len(self.combined_texts)} texts")
+        return embeddings
+
+    def _encode_texts(self, texts: List[str]) -> np.ndarray:
+        """Encode texts in fixed-size chunks into one contiguous, L2-normalized float32 matrix"""
+        dim = self.model.get_sentence_embedding_dimension()
+        embeddings = np.empty((len(texts), dim), dtype=np.float32)
+        
+        for start in range(0, len(texts), EMBEDDING_CHUNK_SIZE):
+            chunk = texts[start:start + EMBEDDING_CHUNK_SIZE]
+            # Stacking tensors and copying once is cheaper than building numpy rows one by one
+            with torch.inference_mode():
+                chunk_embeddings = self.model.encode(
+                    chunk,
+                    batch_size=settings.EMBEDDING_BATCH_SIZE,
+                    show_progress_bar=False,
+                    convert_to_tensor=True,
+                    normalize_embeddings=True
+                )
+            embeddings[start:start + len(chunk)] = chunk_embeddings.cpu().numpy()
+        
+        return embeddings
+
+    @staticmethod
+    def _index_tier(count: int) -> str:
+        if count < HNSW_MIN_VECTORS:
+            return "flat"
+        if count < SQ8_MIN_VECTORS:
+            return "hnsw"
+        if count < IVFPQ_MIN_VECTORS:
+            return "hnsw_sq8"
+        return "ivfpq"
+
+    @staticmethod
+    def _apply_search_params(index: faiss.Index) -> None:
+        """Set query-time recall/speed knobs; IVF nprobe is not stored in the index file"""
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = IVF_NPROBE
+        if hasattr(index, "hnsw"):
+            index.hnsw.efSearch = HNSW_EF_SEARCH
 
+    def _build_index(self, embeddings: np.ndarray) -> faiss.Index:
+        """Build a cosine-similarity index over L2-normalized embeddings, sized to the corpus"""
+        faiss.normalize_L2(embeddings)
+        count, dim = embeddings.shape
+        tier = self._index_tier(count)
+        
+        if tier == "flat":
+            # Exhaustive scan over half-precision codes; halves the bytes read per query
+            index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+        elif tier == "hnsw":
+            index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        elif tier == "hnsw_sq8":
+            index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        else:
+            nlist = int(4 * np.sqrt(count))
+            pq_m = next(m for m in (48, 32, 24, 16, 8, 4, 2, 1) if dim % m == 0)
+            index = faiss.index_factory(dim, f"IVF{nlist},PQ{pq_m}", faiss.METRIC_INNER_PRODUCT)
+        
+        if tier.startswith("hnsw"):
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        self._apply_search_params(index)
+        
+        if not index.is_trained:
+            index.train(embeddings)
+        
+        index.add(embeddings)
+        logger.info(f"Built {tier} vector index over {count} embeddings")
+        return index
+
+    @_serialized
     def process_metadata(self, metadata_json: Dict[str, Any]) -> Dict[str, Any]:
         try:
             logger.info("Processing metadata JSON with persistence...")
@@ -296,42 +755,71 @@ class PersistentEnhancedSchemaVectorStore:
             if "metadata" not in metadata_json or "tables" not in metadata_json:
                 raise ValueError("Invalid metadata format. Expected 'metadata' and 'tables' keys.")
             
-            processed_tables = 0
+            metadata_hash = hashlib.blake2b(
+                orjson.dumps(metadata_json, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS),
+                digest_size=16
+            ).hexdigest()
+            
+            if self.is_metadata_loaded and metadata_hash == self.metadata_hash:
+                logger.info("Metadata unchanged since last upload, skipping reindex")
+                return {
+                    "success": True,
+                    "processed_tables": len(self.table_names),
+                    "total_tables": len(metadata_json["tables"]),
+                    "upload_time": self.metadata_upload_time.isoformat() if self.metadata_upload_time else None,
+                    "message": "Metadata unchanged. Existing index kept."
+                }
+            
+            tables = metadata_json["tables"]
+            valid_tables = [
+                table_data for table_data in tables
+                if isinstance(table_data, dict)
+                and isinstance(table_data.get("schema"), dict)
+                and "table_name" in table_data["schema"]
+            ]
+            if len(valid_tables) < len(tables):
+                logger.warning(f"Skipping {len(tables) - len(valid_tables)} table entries without schema.table_name")
+            
             enriched_texts = []
             table_names = []
+            table_metadata = dict(self.table_metadata)
             
-            for table_data in metadata_json["tables"]:
+            for table_data in valid_tables:
+                schema_info = table_data["schema"]
+                table_name = schema_info["table_name"]
+                llm_analysis = table_data.get("llm_analysis", {})
+                
                 try:
-                    table_name = table_data["schema"]["table_name"]
-                    schema_info = table_data["schema"]
-                    llm_analysis = table_data.get("llm_analysis", {})
-                    
-                    enriched_text = self._create_enriched_text(table_name, schema_info, llm_analysis)
-                    
-                    enriched_texts.append(enriched_text)
-                    table_names.append(table_name)
-                    
-                    self.table_metadata[table_name] = {
-                        "schema": schema_info,
-                        "llm_analysis": llm_analysis,
-                        "processed_at": table_data.get("processed_at")
-                    }
-                    
-                    processed_tables += 1
-                    
+                    enriched_texts.append(self._create_enriched_text(table_name, schema_info, llm_analysis))
                 except Exception as e:
-                    logger.warning(f"Error processing table data: {e}")
+                    logger.warning(f"Error processing table {table_name}: {e}")
                     continue
+                
+                table_names.append(table_name)
+                table_metadata[table_name] = {
+                    "schema": schema_info,
+                    "llm_analysis": llm_analysis,
+                    "processed_at": table_data.get("processed_at")
+                }
+            
+            processed_tables = len(table_names)
             
             if not enriched_texts:
                 raise ValueError("No valid table data found in metadata")
             
+            previous_state = (self.schema_texts, self.table_names, self.is_metadata_loaded, self.metadata_hash, self.metadata_upload_time)
             self.schema_texts = enriched_texts
             self.table_names = table_names
             self.is_metadata_loaded = True
+            self.metadata_hash = metadata_hash
             self.metadata_upload_time = datetime.utcnow()
             
-            self._rebuild_combined_index()
+            try:
+                self._rebuild_combined_index(table_metadata=table_metadata)
+            except Exception:
+                # Otherwise a retry of the same upload would match the hash and skip the rebuild that failed
+                self.schema_texts, self.table_names, self.is_metadata_loaded, self.metadata_hash, self.metadata_upload_time = previous_state
+                raise
             self._save_to_disk()
             
             logger.info(f"Successfully processed and saved {processed_tables} tables from metadata")
@@ -353,149 +841,286 @@ class PersistentEnhancedSchemaVectorStore:
             }
 
     def _create_enriched_text(self, table_name: str, schema_info: Dict[str, Any], llm_analysis: Dict[str, Any]) -> str:
-        text_parts = [f"Table: {table_name}"]
-        
-        if "columns" in schema_info:
-            columns_info = []
-            for col in schema_info["columns"]:
-                col_text = f"{col['name']} ({col['type']}"
-                if not col.get('nullable', True):
-                    col_text += ", NOT NULL"
-                if col.get('autoincrement'):
-                    col_text += ", AUTO_INCREMENT"
-                col_text += ")"
-                columns_info.append(col_text)
-            
-            text_parts.append("Columns: " + ", ".join(columns_info))
-        
-        if schema_info.get("primary_keys"):
-            text_parts.append("Primary Keys: " + ", ".join(schema_info["primary_keys"]))
-        
-        if schema_info.get("foreign_keys"):
-            fk_info = []
-            for fk in schema_info["foreign_keys"]:
-                if isinstance(fk, dict):
-                    fk_info.append(f"{fk.get('column', '')} -> {fk.get('referenced_table', '')}.{fk.get('referenced_column', '')}")
-                else:
-                    fk_info.append(str(fk))
-            text_parts.append("Foreign Keys: " + ", ".join(fk_info))
-        
-        if llm_analysis.get("purpose"):
-            text_parts.append("Purpose: " + llm_analysis["purpose"])
-        
-        if llm_analysis.get("data_patterns"):
-            text_parts.append("Data Patterns: " + "; ".join(llm_analysis["data_patterns"]))
-        
-        if llm_analysis.get("relationships"):
-            rel_info = []
-            for rel in llm_analysis["relationships"]:
-                if isinstance(rel, dict):
-                    rel_info.append(f"Related to {rel.get('table', '')} via {rel.get('relationship_type', '')}")
-                else:
-                    rel_info.append(str(rel))
-            text_parts.append("Relationships: " + "; ".join(rel_info))
-        
-        if llm_analysis.get("observations"):
-            text_parts.append("Observations: " + "; ".join(llm_analysis["observations"]))
-        
-        if schema_info.get("sample_data"):
-            sample_keys = []
-            for sample in schema_info["sample_data"][:3]:
-                if isinstance(sample, dict):
-                    sample_keys.extend(sample.keys())
-            if sample_keys:
-                text_parts.append("Sample Data Fields: " + ", ".join(set(sample_keys)))
-        
-        return "\n".join(text_parts)
+        return "\n".join(_enriched_text_lines(table_name, schema_info, llm_analysis))
 
+    @_serialized
     def build_from_database(self) -> None:
         if self.is_metadata_loaded:
             logger.info("Metadata already loaded, skipping database build")
             return
+        # Concurrent cold searches all call this; only the first one to take the lock builds
+        if self.index is not None:
+            return
             
         logger.info("Building schema store from database...")
         table_names = self.database_service.get_table_names()
         schemas = []
+        described_names = []
         
-        for name in table_names:
+        def describe(name: str):
             try:
-                info = self.database_service.describe_table(name)
-                schemas.append(f"Table {name}: {info}")
-                self.table_names.append(name)
+                return self.database_service.describe_table(name)
             except Exception as e:
                 logger.warning(f"Failed to get schema for {name}: {e}")
+                return None
+        
+        # One describe_table round-trip per pooled connection
+        with ThreadPoolExecutor(max_workers=max(1, min(settings.DB_POOL_SIZE, len(table_names)))) as executor:
+            described = list(executor.map(describe, table_names))
+        
+        for name, rows in zip(table_names, described):
+            if rows is None:
                 continue
+            columns = ", ".join(f"{row[0]} ({row[1]})" for row in rows)
+            schemas.append(f"Table {name}: {columns}")
+            described_names.append(name)
         
         if schemas:
-            embeddings = self.model.encode(schemas)
-            dim = embeddings.shape[1]
-            self.index = faiss.IndexFlatL2(dim)
-            self.index.add(np.array(embeddings, dtype="float32"))
-            self.schema_texts = schemas
+            index = self._build_index(self._encode_texts(schemas))
+            with self._swap_lock:
+                self._index = index
+                self._index_mmapped = False
+                self.table_names = described_names
+                self.schema_texts = schemas
+                self.index_version += 1
             logger.info(f"Schema vector store built from database with {len(schemas)} tables")
 
-    def search(self, query: str, k: int = 5) -> List[Tuple[str, str, Dict[str, Any]]]:
+    def _encode_queries(self, keys: List[str]) -> np.ndarray:
+        """Encode normalized query keys into read-only, L2-normalized float32 rows"""
+        # Encode the normalized key so a cached vector does not depend on which casing arrived first
+        with torch.inference_mode():
+            vectors = np.ascontiguousarray(
+                self.model.encode(keys, batch_size=QUERY_BATCH_SIZE, normalize_embeddings=True),
+                dtype=np.float32
+            )
+        vectors.flags.writeable = False
+        return vectors
+
+    def _cache_query_vector(self, key: str, vector: np.ndarray) -> None:
+        self._query_cache[key] = vector
+        if len(self._query_cache) > QUERY_EMBEDDING_CACHE_SIZE:
+            self._query_cache.popitem(last=False)
+
+    def _cached_query_vector(self, key: str) -> Optional[np.ndarray]:
+        vector = self._query_cache.get(key)
+        if vector is not None:
+            self._query_cache.move_to_end(key)
+        return vector
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        """Embed a search query as a normalized (1, dim) float32 row, reusing recent results"""
+        key = query.strip().lower()
+        
+        vector = self._cached_query_vector(key)
+        if vector is None:
+            vector = self._encode_queries([key])
+            self._cache_query_vector(key, vector)
+        
+        return vector
+
+    async def _embed_query_batched(self, query: str) -> np.ndarray:
+        """Like _embed_query, but coalesces concurrent callers into one encode call per short window"""
+        key = query.strip().lower()
+        
+        vector = self._cached_query_vector(key)
+        if vector is not None:
+            return vector
+        
+        future = asyncio.get_running_loop().create_future()
+        self._pending_queries.append((key, future))
+        if self._query_batch_task is None or self._query_batch_task.done():
+            self._query_batch_task = asyncio.create_task(self._flush_query_batches())
+        
+        return await future
+
+    async def _flush_query_batches(self) -> None:
+        await asyncio.sleep(QUERY_BATCH_WINDOW_SECONDS)
+        
+        while self._pending_queries:
+            batch = self._pending_queries[:QUERY_BATCH_SIZE]
+            del self._pending_queries[:QUERY_BATCH_SIZE]
+            keys = list(dict.fromkeys(key for key, _ in batch))
+            
+            try:
+                vectors = await asyncio.to_thread(self._encode_queries, keys)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            vector_by_key = {}
+            for row, key in enumerate(keys):
+                vector_by_key[key] = vectors[row:row + 1]
+                self._cache_query_vector(key, vector_by_key[key])
+            
+            for key, future in batch:
+                if not future.done():
+                    future.set_result(vector_by_key[key])
+
+    async def aembed_query(self, query: str) -> np.ndarray:
+        """Normalized (1, dim) embedding of a query, shared with the search cache and batcher"""
+        return await self._embed_query_batched(query)
+
+    def _ensure_index(self) -> bool:
+        """Load the stored index, or build one from the database when there is none; False if neither worked"""
         if self.index is None:
             self.build_from_database()
-            if self.index is None:
-                return []
+        return self.index is not None
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[str, str, Dict[str, Any]]]:
+        if not self._ensure_index():
+            return []
         
-        vector = self.model.encode([query])
-        distances, indices = self.index.search(np.array(vector, dtype="float32"), k)
+        cache_key = (query.strip().lower(), k, self.index_version)
+        results = self._cached_search_results(cache_key)
+        if results is None:
+            results = self._collect_results(self._embed_query(query), k)
+            self._cache_search_results(cache_key, results)
+        
+        return list(results)
+
+    async def asearch(self, query: str, k: int = 5) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """Async search; query embeddings of concurrent requests are encoded together"""
+        # Loading the index from disk, building it from the database and the FAISS search all block
+        if (self._index is None or self._vectors_on_disk) and not await asyncio.to_thread(self._ensure_index):
+            return []
+        
+        cache_key = (query.strip().lower(), k, self.index_version)
+        results = self._cached_search_results(cache_key)
+        if results is None:
+            results = await asyncio.to_thread(self._collect_results, await self._embed_query_batched(query), k)
+            self._cache_search_results(cache_key, results)
+        
+        return list(results)
+
+    def rerank(self, query: str, results: List[Tuple[str, str, Dict[str, Any]]], k: int) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """Top k search results reordered by a cross-encoder; the first k unchanged when no reranker is configured"""
+        if not settings.RERANKER_MODEL or len(results) <= 1:
+            return results[:k]
+        
+        scores = _get_cross_encoder(settings.RERANKER_MODEL).predict([(query, text) for _, text, _ in results])
+        return [results[idx] for idx in np.argsort(-scores, kind="stable")[:k]]
+
+    async def arerank(self, query: str, results: List[Tuple[str, str, Dict[str, Any]]], k: int) -> List[Tuple[str, str, Dict[str, Any]]]:
+        return await asyncio.to_thread(self.rerank, query, results, k)
+
+    def _cached_search_results(self, cache_key: Tuple[str, int, int]) -> Optional[List[Tuple[str, str, Dict[str, Any]]]]:
+        entry = self._search_cache.get(cache_key)
+        if entry is None:
+            return None
+        
+        stored_at, results = entry
+        if time.monotonic() - stored_at > settings.CACHE_TTL:
+            del self._search_cache[cache_key]
+            return None
+        
+        self._search_cache.move_to_end(cache_key)
+        return results
+
+    def _cache_search_results(self, cache_key: Tuple[str, int, int], results: List[Tuple[str, str, Dict[str, Any]]]) -> None:
+        self._search_cache[cache_key] = (time.monotonic(), results)
+        if len(self._search_cache) > SEARCH_RESULT_CACHE_SIZE:
+            self._search_cache.popitem(last=False)
+
+    def _collect_results(self, vector: np.ndarray, k: int) -> List[Tuple[str, str, Dict[str, Any]]]:
+        # Writers replace these together under the swap lock, so one consistent corpus is read
+        with self._swap_lock:
+            index = self.index
+            combined_texts, text_types, text_identifiers = self.combined_texts, self.text_types, self.text_identifiers
+            table_names, schema_texts, table_metadata = self.table_names, self.schema_texts, self.table_metadata
+            business_logic_by_id = self._business_logic_by_id
+        
+        if index is None:
+            return []
+        
+        params = None
+        if hasattr(index, "hnsw") and k * HNSW_EF_PER_RESULT > HNSW_EF_SEARCH:
+            params = faiss.SearchParametersHNSW(efSearch=k * HNSW_EF_PER_RESULT)
+        distances, indices = index.search(vector, k, params=params)
+        
+        # FAISS pads with -1 when fewer than k neighbours exist
+        hits = indices[0][indices[0] >= 0].tolist()
+        
+        if not combined_texts:
+            return [
+                (table_names[idx], schema_texts[idx], table_metadata.get(table_names[idx], {}))
+                for idx in hits if idx < len(table_names)
+            ]
         
         results = []
-        for idx in indices[0]:
-            if idx < len(self.combined_texts) if self.combined_texts else len(self.table_names):
-                if self.combined_texts:
-                    text_type = self.text_types[idx]
-                    identifier = self.text_identifiers[idx]
-                    content = self.combined_texts[idx]
-                    
-                    if text_type == "schema":
-                        metadata = self.table_metadata.get(identifier, {})
-                        results.append((identifier, content, metadata))
-                    elif text_type == "business_logic":
-                        business_metadata = None
-                        for meta in self.business_logic_metadata:
-                            if meta["chunk_id"] == identifier:
-                                business_metadata = meta
-                                break
-                        
-                        if business_metadata is None:
-                            business_metadata = {"type": "business_logic", "chunk_id": identifier}
-                        
-                        results.append((identifier, content, business_metadata))
-                else:
-                    table_name = self.table_names[idx]
-                    schema_text = self.schema_texts[idx]
-                    metadata = self.table_metadata.get(table_name, {})
-                    results.append((table_name, schema_text, metadata))
+        for idx in hits:
+            if idx >= len(combined_texts):
+                continue
+            
+            text_type = text_types[idx]
+            identifier = text_identifiers[idx]
+            content = combined_texts[idx]
+            
+            if text_type == "schema":
+                metadata = table_metadata.get(identifier, {})
+                results.append((identifier, content, metadata))
+            elif text_type == "business_logic":
+                business_metadata = business_logic_by_id.get(identifier)
+                if business_metadata is None:
+                    business_metadata = {"type": "business_logic", "chunk_id": identifier}
+                
+                results.append((identifier, content, business_metadata))
         
         return results
 
+    def result_summary(self, table_name: str, schema_text: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Display projection of a search hit, built once per index version; callers must not mutate it"""
+        if self._result_summaries_version != self.index_version:
+            self._result_summaries = {}
+            self._result_summaries_version = self.index_version
+        
+        summary = self._result_summaries.get(table_name)
+        if summary is None:
+            analysis = metadata.get("llm_analysis", {})
+            summary = {
+                "table_name": table_name,
+                "schema_summary": schema_text[:SCHEMA_SUMMARY_LENGTH] + "..." if len(schema_text) > SCHEMA_SUMMARY_LENGTH else schema_text,
+                "purpose": analysis.get("purpose", ""),
+                "data_patterns": analysis.get("data_patterns", []),
+                "relationships": analysis.get("relationships", [])
+            }
+            self._result_summaries[table_name] = summary
+        
+        return summary
+
     def get_table_details(self, table_name: str) -> Optional[Dict[str, Any]]:
         return self.table_metadata.get(table_name)
 
-    def get_status(self) -> Dict[str, Any]:
-        return {
+    def get_status(self, include_files: bool = False) -> Dict[str, Any]:
+        """In-memory knowledge base status; pass include_files=True to also stat() each storage file"""
+        status = {
             "metadata_loaded": self.is_metadata_loaded,
             "business_logic_loaded": self.is_business_logic_loaded,
             "upload_time": self.metadata_upload_time.isoformat() if self.metadata_upload_time else None,
             "business_logic_upload_time": self.business_logic_upload_time.isoformat() if self.business_logic_upload_time else None,
             "total_tables": len(self.table_names),
             "total_business_logic_chunks": len(self.business_logic_texts),
-            "index_built": self.index is not None,
-            "storage_path": str(self.storage_path),
-            "files_exist": {
+            "index_built": self._index is not None or self._vectors_on_disk,
+            "storage_path": str(self.storage_path)
+        }
+        
+        if include_files:
+            status["files_exist"] = {
                 "metadata": self._get_metadata_file().exists(),
                 "business_logic": self._get_business_logic_file().exists(),
                 "vector_index": self._get_index_file().exists(),
+                "embeddings": self._get_embeddings_file().exists(),
                 "combined_texts": self._get_combined_texts_file().exists()
             }
-        }
+        
+        return status
 
+    @_serialized
     def clear_all(self) -> None:
         self._reset_state()
+        self._query_cache.clear()
+        self._search_cache.clear()
         
         try:
             for file_path in [
@@ -503,20 +1128,24 @@ class PersistentEnhancedSchemaVectorStore:
                 self._get_business_logic_file(),
                 self._get_index_file(),
                 self._get_combined_texts_file(),
+                self._get_legacy_combined_texts_file(),
+                self._get_embeddings_file(),
                 self._get_text_metadata_file()
             ]:
-                if file_path.exists():
-                    os.remove(file_path)
+                file_path.unlink(missing_ok=True)
+                # Also remove temp files left behind by an interrupted save
+                file_path.with_suffix(file_path.suffix + ".tmp").unlink(missing_ok=True)
             
             logger.info("Knowledge base cleared completely and files removed")
         except Exception as e:
             logger.error(f"Error removing files during clear: {e}")
 
+    @_serialized
     def rebuild_index(self) -> None:
         if not self.is_metadata_loaded and not self.is_business_logic_loaded:
             raise ValueError("No metadata or business logic loaded to rebuild index from")
         
         logger.info("Rebuilding vector index...")
-        self._rebuild_combined_index()
+        self._rebuild_combined_index(force=True)
         self._save_to_disk()
         logger.info("Vector index rebuilt and saved")
\ No newline at end of file
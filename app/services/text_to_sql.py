@@ -1,14 +1,22 @@
+import asyncio
+import hashlib
+import re
+import sys
 import time
 import logging
 import json
-from typing import Optional, Dict, Any, List, Tuple
+from collections import OrderedDict
+from typing import Optional, Dict, Any, AsyncIterator, List, Tuple
 from datetime import datetime, date, timedelta
-from langchain_community.utilities import SQLDatabase
+import orjson
+import sqlglot
+from sqlglot import exp
 from langchain_openai import ChatOpenAI
 from langchain_ollama import ChatOllama
 from langchain_google_genai import ChatGoogleGenerativeAI
 
 from app.services.schema_store import PersistentEnhancedSchemaVectorStore
+from app.services.query_cache import SemanticQueryCache
 
 from ..schemas.query import QueryResponse
 from ..schemas.database import TableInfo
@@ -18,20 +26,447 @@ from ..core.exceptions import QueryExecutionError, LLMServiceError
 
 logger = logging.getLogger(__name__)
 
+_THINK_RE = re.compile(r"<think>.*?</think>", re.IGNORECASE | re.DOTALL)
+_SQL_FENCE_RE = re.compile(r"```(?:sql)?", re.IGNORECASE)
+_SQL_COMMENT_LINE_RE = re.compile(r"^\s*--.*$", re.MULTILINE)
+_SQL_FALLBACK_RE = re.compile(r'(SELECT.*?)(?:\n\n|\Z)', re.DOTALL | re.IGNORECASE)
+_SQL_START_KEYWORDS = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+_EXPLANATION_INDICATORS = ("generate the", "instructions:", "fix", "validation")
+_SQL_START_LINE_RE = re.compile(rf"^\s*(?:{'|'.join(_SQL_START_KEYWORDS)})", re.IGNORECASE | re.MULTILINE)
+_EXPLANATION_LINE_RE = re.compile(
+    rf"^(?!\s*(?:{'|'.join(_SQL_START_KEYWORDS)}))[^\n]*?(?:{'|'.join(map(re.escape, _EXPLANATION_INDICATORS))})",
+    re.IGNORECASE | re.MULTILINE
+)
+_SQL_WHITESPACE_RE = re.compile(r"(?:\\[nt]|\s)+")
+_BATCH_SQL_RE = re.compile(r"^\s*Q(\d+):\s*(.*?)(?=^\s*Q\d+:|\Z)", re.MULTILINE | re.DOTALL)
+# sqlglot reads LIMIT as TOP when parsing T-SQL, so the clause is spotted in the text
+_SQL_LIMIT_RE = re.compile(r"\bLIMIT\s+\d+", re.IGNORECASE)
+
+MAX_SQL_BATCH_SIZE = 10
+SEARCH_CANDIDATES = 12
+# With a reranker configured, a wider vector search is narrowed back to SEARCH_CANDIDATES by the cross-encoder
+RERANK_CANDIDATES = 30
+VALIDATION_CACHE_SIZE = 1024
+MAX_SQL_OUTPUT_CHARS = 8192
+
+# Generation and fix prompts ask for SQL only; these cut off trailing prose before it is decoded
+SQL_STOP_SEQUENCES = ["\n\nExplanation", "\n\nThis query", "\n\nNote:"]
+
+# Prompts put their fixed instructions first and request-specific content last, so consecutive
+# calls share a long identical prefix that provider-side prompt caching can reuse.
+QUERY_PLANNING_PROMPT = """You are a database expert. Analyze this database query request, extract the user's intent and requirements, and select the tables needed to answer it.
+
+Table selection instructions:
+1. Analyze which tables are most relevant to answer the user's query
+2. Select 3-5 most relevant tables
+3. Prioritize tables that contain the main entities and required data
+4. Refer to tables by their number in the Available Tables list
+
+Respond with a JSON object with the following structure:
+{{
+    "intent": {{
+        "query_type": "select|insert|update|delete|aggregate|reporting",
+        "main_entities": ["entity1", "entity2"],
+        "time_filters": {{
+            "has_time_filter": true/false,
+            "time_period": "today|this_week|this_month|this_year|specific_date|date_range",
+            "time_description": "description of time requirement"
+        }},
+        "aggregations": {{
+            "has_aggregation": true/false,
+            "functions": ["count", "sum", "avg", "max", "min"],
+            "group_by_needed": true/false
+        }},
+        "filters": {{
+            "has_filters": true/false,
+            "filter_types": ["comparison", "contains", "equals", "range"],
+            "filter_description": "description of filtering needs"
+        }},
+        "relationships": {{
+            "needs_joins": true/false,
+            "relationship_description": "description of data relationships needed"
+        }},
+        "output_requirements": {{
+            "limit_needed": true/false,
+            "suggested_limit": 100,
+            "sorting_needed": true/false,
+            "sort_description": "description of sorting requirements"
+        }},
+        "business_context": "description of what user wants to achieve"
+    }},
+    "selected_tables": [1, 3, 5]
+}}
+
+Available Tables:
+{table_descriptions}
+
+User Query: "{user_query}"
+
+Provide only the JSON response:"""
+
+
+SQL_GENERATION_RULES = """CRITICAL SQL GENERATION REQUIREMENTS:
+1. Use ONLY the exact table names and column names from the schema provided
+2. Generate syntactically perfect Microsoft SQL Server T-SQL
+3. Use appropriate JOINs when data spans multiple tables
+4. Include proper WHERE clauses for filtering and date conditions
+5. Add aggregation functions (COUNT, SUM, AVG, MAX, MIN) if needed
+6. Include GROUP BY clauses when using aggregations
+7. Add ORDER BY clauses for sorting when appropriate
+8. Use TOP clause to limit results (default TOP 100 unless specified)
+9. Handle date/time filtering using proper SQL Server date functions
+10. Use full table names in format: TableName.ColumnName
+11. Do NOT use table aliases or AS clauses for tables
+12. Generate clean, executable, production-ready SQL
+
+IMPORTANT NOTES:
+- For date filtering, use appropriate functions like CAST, CONVERT, GETDATE(), DATEADD(), DATEDIFF()
+- For "today" queries, use: WHERE CAST(DateColumn AS DATE) = CAST(GETDATE() AS DATE)
+- For "this month" queries, use: WHERE MONTH(DateColumn) = MONTH(GETDATE()) AND YEAR(DateColumn) = YEAR(GETDATE())
+- For aggregations, always include GROUP BY for non-aggregated columns
+- Join tables using their foreign key relationships shown in the schema"""
+
+
+# Generation, validation and repair all open with the same rules and schema context, so the
+# follow-up calls for one request reuse the prefix the generation call already had cached
+SQL_SCHEMA_PREFIX = """You are an expert Microsoft SQL Server T-SQL developer working with the database schema below.
+
+""" + SQL_GENERATION_RULES + """
+
+{schema_context}
+
+"""
+
+
+SQL_GENERATION_PROMPT = SQL_SCHEMA_PREFIX + """TASK: Generate the perfect SQL query based on the comprehensive analysis below.
+
+{date_context}
+
+USER INTENT ANALYSIS:
+{intent_analysis}
+
+USER REQUEST: "{user_query}"
+
+Generate the SQL query that perfectly fulfills the user's request:"""
+
+
+SQL_BATCH_GENERATION_PROMPT = SQL_SCHEMA_PREFIX + """TASK: Generate one SQL query for each of the numbered user requests below.
+
+{date_context}
+
+USER INTENT ANALYSIS:
+{intent_analysis}
+
+USER REQUESTS:
+{user_queries}
+
+Output exactly one SQL query per request, prefixed by its request label (for example "Q1: SELECT ..."). Do not add explanations.
+
+SQL queries:"""
+
+
+SQL_VALIDATION_PROMPT = SQL_SCHEMA_PREFIX + """TASK: Validate this SQL query against the schema above.
+
+VALIDATION REQUIREMENTS:
+1. Check if all table names in the SQL exist in the available tables
+2. Check if all column names exist in their respective tables
+3. Verify JOIN conditions use valid foreign key relationships
+4. Ensure syntax is correct for Microsoft SQL Server
+5. Check for any syntax errors or invalid constructs
+
+Respond with a JSON object:
+{{
+    "is_valid": true/false,
+    "errors": ["error1", "error2"],
+    "suggestions": ["suggestion1", "suggestion2"]
+}}
+
+AVAILABLE TABLE NAMES: {table_names}
+
+SQL QUERY TO VALIDATE:
+{sql_query}
+
+Validation result:"""
+
+
+SQL_FIX_PROMPT = SQL_SCHEMA_PREFIX + """TASK: Fix the SQL query based on the validation errors.
+
+INSTRUCTIONS:
+1. Fix all the validation errors mentioned below
+2. Use ONLY the exact table and column names from the schema
+3. Maintain the original intent and logic of the query
+4. Generate syntactically correct Microsoft SQL Server T-SQL
+5. Do NOT use table aliases
+6. Use full table names in format: TableName.ColumnName
+
+ORIGINAL USER REQUEST: "{user_query}"
+
+USER INTENT: {intent_analysis}
+
+BROKEN SQL QUERY:
+{sql_query}
+
+VALIDATION ERRORS:
+{validation_errors}
+
+Generate the corrected SQL query:"""
+
+
+def _table_core_lines(table_name: str, metadata: Optional[Dict[str, Any]]):
+    """Yield the lines the model needs to write SQL against one table"""
+    yield f"\nTABLE: {table_name}"
+    yield "-" * 40
+    
+    if not metadata or not metadata.get("schema"):
+        return
+    
+    schema = metadata["schema"]
+    analysis = metadata.get("llm_analysis", {})
+    
+    yield f"Business Purpose: {analysis.get('purpose', 'Data storage table')}"
+    
+    yield "Column Definitions:"
+    for col in schema.get("columns", []):
+        nullable = "NULL" if col.get("nullable", True) else "NOT NULL"
+        extra_info = " AUTO_INCREMENT" if col.get("autoincrement") else ""
+        yield f"  - {col['name']}: {col['type']} ({nullable}){extra_info}"
+    
+    if schema.get("primary_keys"):
+        yield f"Primary Key: {', '.join(schema['primary_keys'])}"
+    
+    if schema.get("foreign_keys"):
+        yield "Foreign Key Relationships:"
+        for fk in schema["foreign_keys"]:
+            if isinstance(fk, dict):
+                yield f"  - {fk.get('column')} references {fk.get('referenced_table')}.{fk.get('referenced_column')}"
+
+
+def _table_detail_lines(metadata: Optional[Dict[str, Any]]):
+    """Yield the optional sample data and analysis lines for one table"""
+    if not metadata or not metadata.get("schema"):
+        return
+    
+    schema = metadata["schema"]
+    analysis = metadata.get("llm_analysis", {})
+    
+    if schema.get("sample_data"):
+        yield "Sample Data (showing data patterns):"
+        for key, value in list(schema["sample_data"][0].items())[:5]:
+            if value is not None:
+                yield f"  - {key}: {repr(value)}"
+    
+    if analysis.get("data_patterns"):
+        yield "Data Patterns:"
+        for pattern in analysis["data_patterns"][:3]:
+            yield f"  - {pattern}"
+    
+    if analysis.get("relationships"):
+        yield "Business Relationships:"
+        for rel in analysis["relationships"][:2]:
+            if isinstance(rel, dict):
+                yield f"  - Related to {rel.get('table')} via {rel.get('relationship_type')}"
+            else:
+                yield f"  - {str(rel)}"
+
+
+def _column_set(metadata: Optional[Dict[str, Any]]) -> Optional[frozenset]:
+    """Lowercased, interned column names of a table; None without schema metadata"""
+    schema = (metadata or {}).get("schema") or {}
+    if not schema.get("columns"):
+        return None
+    # Names like id, name and created_at repeat across most tables, so one shared copy of each is kept
+    return frozenset(sys.intern(col["name"].lower()) for col in schema["columns"])
+
+
+def _static_sql_check(sql_query: str, table_columns: Dict[str, frozenset], table_names: List[str]) -> Optional[Tuple[bool, str]]:
+    """Check SQL against the selected tables' columns; None when it cannot be decided by parsing"""
+    try:
+        tree = sqlglot.parse_one(sql_query, read="tsql")
+    except Exception:
+        return None
+    if tree is None:
+        return None
+    
+    # CTEs and subqueries define their own columns, so references through them cannot be checked here
+    cte_names = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+    derived_aliases = cte_names | {subquery.alias.lower() for subquery in tree.find_all(exp.Subquery) if subquery.alias}
+    tables = [table for table in tree.find_all(exp.Table) if table.name.lower() not in cte_names]
+    alias_to_table = {table.alias_or_name.lower(): table.name.lower() for table in tables}
+    has_derived_sources = any(True for _ in tree.find_all(exp.Subquery)) or bool(cte_names)
+    select_aliases = {alias.alias.lower() for alias in tree.find_all(exp.Alias)}
+    
+    selected = {name.lower() for name in table_names}
+    unknown_tables = []
+    for table in tables:
+        if table.name.lower() not in selected and table.name not in unknown_tables:
+            unknown_tables.append(table.name)
+    
+    referenced = set(alias_to_table.values())
+    decidable = True
+    unknown_qualifiers = []
+    unknown_columns = []
+    ambiguous_columns = []
+    for column in tree.find_all(exp.Column):
+        name = column.name.lower()
+        if not name or isinstance(column.this, exp.Star):
+            continue
+        
+        if column.table:
+            qualifier = column.table.lower()
+            table = alias_to_table.get(qualifier)
+            if table is None:
+                if qualifier in derived_aliases:
+                    decidable = False
+                elif column.table not in unknown_qualifiers:
+                    unknown_qualifiers.append(column.table)
+                continue
+            if table not in table_columns:
+                decidable = False
+            elif name not in table_columns[table]:
+                unknown_columns.append(f"{column.table}.{column.name}")
+            continue
+        
+        if name in select_aliases:
+            continue
+        if has_derived_sources or not referenced <= table_columns.keys():
+            decidable = False
+            continue
+        
+        owners = [table for table in referenced if name in table_columns[table]]
+        if not owners:
+            unknown_columns.append(column.name)
+        elif len(owners) > 1:
+            ambiguous_columns.append(column.name)
+    
+    errors = []
+    if _SQL_LIMIT_RE.search(sql_query):
+        errors.append("LIMIT is not supported by SQL Server; use TOP")
+    if unknown_tables:
+        errors.append(f"Unknown tables: {', '.join(unknown_tables)}")
+    if unknown_qualifiers:
+        errors.append(f"Unknown table names or aliases: {', '.join(unknown_qualifiers)}")
+    if unknown_columns:
+        errors.append(f"Unknown columns: {', '.join(dict.fromkeys(unknown_columns))}")
+    if ambiguous_columns:
+        errors.append(f"Ambiguous columns, qualify them with their table: {', '.join(dict.fromkeys(ambiguous_columns))}")
+    if errors:
+        return False, "; ".join(errors)
+    
+    return (True, "") if decidable else None
+
+
+def _mechanical_sql_fix(sql_query: str, table_columns: Dict[str, frozenset]) -> Optional[str]:
+    """Rewrite LIMIT to TOP, expand table aliases and move columns onto the one table that has them; None if nothing changed"""
+    try:
+        tree = sqlglot.parse_one(sql_query, read="tsql")
+    except Exception:
+        return None
+    if tree is None or any(True for _ in tree.find_all(exp.Subquery)) or any(True for _ in tree.find_all(exp.CTE)):
+        return None
+    
+    tables = list(tree.find_all(exp.Table))
+    referenced = {table.name.lower(): table.name for table in tables}
+    # Self joins cannot be written without aliases
+    if len(referenced) != len(tables):
+        return None
+    
+    changed = bool(_SQL_LIMIT_RE.search(sql_query))
+    alias_to_table = {}
+    for table in tables:
+        if table.alias and table.alias.lower() != table.name.lower():
+            alias_to_table[table.alias.lower()] = table.name
+            table.set("alias", None)
+            changed = True
+    
+    select_aliases = {alias.alias.lower() for alias in tree.find_all(exp.Alias)}
+    for column in tree.find_all(exp.Column):
+        name = column.name.lower()
+        if not name or isinstance(column.this, exp.Star):
+            continue
+        
+        qualifier = column.table.lower() if column.table else None
+        if qualifier in alias_to_table:
+            column.set("table", exp.to_identifier(alias_to_table[qualifier]))
+            qualifier = alias_to_table[qualifier].lower()
+            changed = True
+        
+        if qualifier is None and name in select_aliases:
+            continue
+        if qualifier is not None and (qualifier not in referenced or name in table_columns.get(qualifier, ())):
+            continue
+        
+        owners = [table for table in referenced if name in table_columns.get(table, ())]
+        if len(owners) == 1:
+            column.set("table", exp.to_identifier(referenced[owners[0]]))
+            changed = True
+    
+    return tree.sql(dialect="tsql") if changed else None
+
+
+def _parse_json_response(text: str) -> Any:
+    """Parse an LLM JSON answer, tolerating a surrounding markdown fence"""
+    text = text.strip()
+    if text.startswith('```json'):
+        text = text[7:]
+    if text.startswith('```'):
+        text = text[3:]
+    if text.endswith('```'):
+        text = text[:-3]
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers' handlers still apply
+    return orjson.loads(text.strip())
+
+
+def _format_intent(intent_analysis: Dict[str, Any]) -> str:
+    return orjson.dumps(intent_analysis, option=orjson.OPT_INDENT_2).decode()
+
+
+def _estimate_tokens(text: str) -> int:
+    # Roughly four characters per token across the supported providers' tokenizers
+    return len(text) // 4 + 1
+
 
 class TextToSQLService:
     
     def __init__(self, llm_service, database_service: DatabaseService):
         self.database_service = database_service
         self.llm_service = llm_service
+        self._table_context_cache: Dict[str, Tuple[str, str, int, int]] = {}
+        self._table_context_version: Optional[int] = None
+        self._column_set_cache: Dict[str, Optional[frozenset]] = {}
+        self._database_info_cache: Optional[TableInfo] = None
+        self._table_description_cache: Dict[str, str] = {}
+        self._database_info_version: Optional[int] = None
+        self._date_context_day: Optional[date] = None
+        self._date_context_parts: Tuple[str, str] = ("", "")
+        self._date_context_minute: Optional[datetime] = None
+        self._date_context: str = ""
+        self._inflight_completions: Dict[Tuple[int, str], asyncio.Future] = {}
+        # Bounds calls in flight to the provider, so bursts queue here instead of failing on its rate limits
+        self._llm_slots = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        self._validation_cache: "OrderedDict[bytes, Tuple[bool, str]]" = OrderedDict()
+        self.query_cache = SemanticQueryCache(
+            max_entries=settings.QUERY_CACHE_SIZE,
+            similarity_threshold=settings.QUERY_CACHE_SIMILARITY,
+            ttl_seconds=settings.CACHE_TTL
+        )
         
         try:
             if settings.DEFAULT_LLM_PROVIDER.lower() == "ollama":
-                self.llm = ChatOllama(
+                # A context window sized for the schema prompt and a long keep_alive keep the model
+                # resident with its prompt cache, instead of reloading cold between requests
+                ollama_options = dict(
                     model=settings.OLLAMA_MODEL,
                     base_url=settings.OLLAMA_BASE_URL,
                     temperature=0.0,
-                    num_predict=settings.OLLAMA_MAX_TOKENS
+                    num_predict=settings.OLLAMA_MAX_TOKENS,
+                    num_ctx=settings.OLLAMA_NUM_CTX,
+                    keep_alive=settings.OLLAMA_KEEP_ALIVE
+                )
+                self.llm = ChatOllama(**ollama_options)
+                self.json_llm = ChatOllama(**ollama_options, format="json")
+                self.sql_llm = ChatOllama(
+                    **{**ollama_options, "num_predict": settings.SQL_MAX_OUTPUT_TOKENS},
+                    stop=SQL_STOP_SEQUENCES
                 )
             elif settings.DEFAULT_LLM_PROVIDER.lower() == "gemini":
                 self.llm = ChatGoogleGenerativeAI(
@@ -40,6 +475,14 @@ class TextToSQLService:
                     google_api_key=settings.GEMINI_API_KEY,
                     max_output_tokens=settings.GEMINI_MAX_TOKENS
                 )
+                # The pinned langchain-google-genai has no JSON response mode
+                self.json_llm = self.llm
+                self.sql_llm = ChatGoogleGenerativeAI(
+                    model=settings.GEMINI_MODEL,
+                    temperature=0.0,
+                    google_api_key=settings.GEMINI_API_KEY,
+                    max_output_tokens=settings.SQL_MAX_OUTPUT_TOKENS
+                )
             else:
                 self.llm = ChatOpenAI(
                     model=settings.OPENAI_MODEL,
@@ -47,8 +490,10 @@ class TextToSQLService:
                     api_key=settings.OPENAI_API_KEY,
                     max_tokens=settings.OPENAI_MAX_TOKENS
                 )
+                # Bindings override request parameters only, so all three share one client and connection pool
+                self.json_llm = self.llm.bind(response_format={"type": "json_object"})
+                self.sql_llm = self.llm.bind(max_tokens=settings.SQL_MAX_OUTPUT_TOKENS, stop=SQL_STOP_SEQUENCES)
 
-            self.sql_db = SQLDatabase.from_uri(settings.DATABASE_URL)
             self.enhanced_schema_store = PersistentEnhancedSchemaVectorStore(self.database_service)
 
             logger.info(f"TextToSQLService initialized with {settings.DEFAULT_LLM_PROVIDER.upper()} LLM")
@@ -57,93 +502,78 @@ class TextToSQLService:
             logger.error(f"Failed to initialize TextToSQLService: {str(e)}")
             self.enhanced_schema_store = None
     
+    @property
+    def sql_db(self):
+        """Shared SQLDatabase owned by the DatabaseService, so the engine and reflection happen once"""
+        self.database_service._ensure_connection()
+        return self.database_service.db
+    
     def _get_current_date_context(self) -> str:
-        now = datetime.now()
-        today = date.today()
-        week_start = today - timedelta(days=today.weekday())
-        month_start = today.replace(day=1)
-        year_start = today.replace(month=1, day=1)
+        # Minute resolution keeps the prompt identical for every request within the same minute
+        now = datetime.now().replace(second=0, microsecond=0)
+        if now == self._date_context_minute:
+            return self._date_context
+        today = now.date()
         
-        return f"""Current Date and Time Information:
+        # Everything except the time line only changes at midnight
+        if self._date_context_day != today:
+            week_start = today - timedelta(days=today.weekday())
+            month_start = today.replace(day=1)
+            year_start = today.replace(month=1, day=1)
+            
+            self._date_context_parts = (
+                f"""Current Date and Time Information:
 Today's Date: {today.strftime('%Y-%m-%d')}
-Current Year: {now.year}
-Current Month: {now.month} ({now.strftime('%B')})
-Current Day: {now.day}
-Current Time: {now.strftime('%H:%M:%S')}
+Current Year: {today.year}
+Current Month: {today.month} ({today.strftime('%B')})
+Current Day: {today.day}
+Current Time: """,
+                f"""
 Week Start (Monday): {week_start.strftime('%Y-%m-%d')}
 Month Start: {month_start.strftime('%Y-%m-%d')}
 Year Start: {year_start.strftime('%Y-%m-%d')}
-Day of Week: {now.strftime('%A')}"""
-
-    async def _analyze_user_intent(self, user_query: str) -> Dict[str, Any]:
-        """Use LLM to analyze user intent and requirements"""
+Day of Week: {today.strftime('%A')}"""
+            )
+            self._date_context_day = today
         
-        intent_prompt = f"""Analyze this database query request and extract the user's intent and requirements.
-
-User Query: "{user_query}"
+        head, tail = self._date_context_parts
+        self._date_context = f"{head}{now:%H:%M}{tail}"
+        self._date_context_minute = now
+        return self._date_context
 
-Analyze and provide a JSON response with the following structure:
-{{
-    "query_type": "select|insert|update|delete|aggregate|reporting",
-    "main_entities": ["entity1", "entity2"],
-    "time_filters": {{
-        "has_time_filter": true/false,
-        "time_period": "today|this_week|this_month|this_year|specific_date|date_range",
-        "time_description": "description of time requirement"
-    }},
-    "aggregations": {{
-        "has_aggregation": true/false,
-        "functions": ["count", "sum", "avg", "max", "min"],
-        "group_by_needed": true/false
-    }},
-    "filters": {{
-        "has_filters": true/false,
-        "filter_types": ["comparison", "contains", "equals", "range"],
-        "filter_description": "description of filtering needs"
-    }},
-    "relationships": {{
-        "needs_joins": true/false,
-        "relationship_description": "description of data relationships needed"
-    }},
-    "output_requirements": {{
-        "limit_needed": true/false,
-        "suggested_limit": 100,
-        "sorting_needed": true/false,
-        "sort_description": "description of sorting requirements"
-    }},
-    "business_context": "description of what user wants to achieve"
-}}
-
-Provide only the JSON response:"""
+    async def _complete(self, llm, prompt: str) -> str:
+        """Text of an LLM completion; concurrent identical prompts share one in-flight call"""
+        key = (id(llm), prompt)
+        task = self._inflight_completions.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._invoke_llm(llm, prompt))
+            self._inflight_completions[key] = task
+            task.add_done_callback(lambda _: self._inflight_completions.pop(key, None))
+        
+        # Shielded so one caller disconnecting does not cancel the call for the others
+        return await asyncio.shield(task)
 
-        try:
-            if hasattr(self.llm, 'ainvoke'):
-                response = await self.llm.ainvoke(intent_prompt)
+    async def _invoke_llm(self, llm, prompt: str) -> str:
+        """Clients without async support are run off the event loop"""
+        async with self._llm_slots:
+            if hasattr(llm, 'ainvoke'):
+                response = await llm.ainvoke(prompt)
             else:
-                response = self.llm.invoke(intent_prompt)
-            
-            if hasattr(response, 'content'):
-                analysis_text = response.content
-            else:
-                analysis_text = str(response)
-            
-            try:
-                analysis_text = analysis_text.strip()
-                if analysis_text.startswith('```json'):
-                    analysis_text = analysis_text[7:]
-                if analysis_text.startswith('```'):
-                    analysis_text = analysis_text[3:]
-                if analysis_text.endswith('```'):
-                    analysis_text = analysis_text[:-3]
-                
-                return json.loads(analysis_text.strip())
-            except json.JSONDecodeError:
-                logger.warning("Failed to parse intent analysis JSON")
-                return self._get_default_intent()
-                
-        except Exception as e:
-            logger.warning(f"Intent analysis failed: {e}")
-            return self._get_default_intent()
+                response = await asyncio.to_thread(llm.invoke, prompt)
+        
+        return response.content if hasattr(response, 'content') else str(response)
+
+    async def _stream_llm(self, llm, prompt: str) -> AsyncIterator[str]:
+        """Text chunks of an LLM completion as they are decoded"""
+        if not hasattr(llm, 'astream'):
+            yield await self._invoke_llm(llm, prompt)
+            return
+        
+        async with self._llm_slots:
+            async for chunk in llm.astream(prompt):
+                text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                if text:
+                    yield text
 
     def _get_default_intent(self) -> Dict[str, Any]:
         """Default intent structure when LLM analysis fails"""
@@ -158,11 +588,8 @@ Provide only the JSON response:"""
             "business_context": "General data retrieval"
         }
 
-    async def _select_relevant_tables(self, user_query: str, search_results: List[Tuple], intent_analysis: Dict) -> List[Tuple]:
-        """Use LLM to intelligently select the most relevant tables"""
-        
-        if not search_results:
-            return []
+    async def _plan_query(self, user_query: str, search_results: List[Tuple]) -> Tuple[Dict[str, Any], List[Tuple]]:
+        """Use one LLM call to analyze the user's intent and select the most relevant tables"""
         
         table_descriptions = []
         for i, (table_name, schema_text, metadata) in enumerate(search_results):
@@ -173,223 +600,158 @@ Provide only the JSON response:"""
             
             table_descriptions.append(f"{i+1}. {table_name}: {purpose} (Key columns: {', '.join(columns[:8])})")
         
-        selection_prompt = f"""You are a database expert. Select the most relevant tables for this query.
-
-User Query: "{user_query}"
-
-User Intent Analysis: {json.dumps(intent_analysis, indent=2)}
-
-Available Tables:
-{chr(10).join(table_descriptions)}
-
-Instructions:
-1. Analyze which tables are most relevant to answer the user's query
-2. Consider the user's intent and requirements
-3. Select 3-5 most relevant tables
-4. Prioritize tables that contain the main entities and required data
-
-Respond with a JSON array of the most relevant table numbers (1-{len(search_results)}):
-Example: [1, 3, 5]
-
-Selected table numbers:"""
-
+        plan_prompt = QUERY_PLANNING_PROMPT.format(
+            user_query=user_query,
+            table_descriptions="\n".join(table_descriptions)
+        )
+        
+        intent_analysis = self._get_default_intent()
+        selected_tables = search_results[:5]
+        
         try:
-            if hasattr(self.llm, 'ainvoke'):
-                response = await self.llm.ainvoke(selection_prompt)
-            else:
-                response = self.llm.invoke(selection_prompt)
+            plan = _parse_json_response(await self._complete(self.json_llm, plan_prompt))
             
-            if hasattr(response, 'content'):
-                selection_text = response.content
-            else:
-                selection_text = str(response)
+            if isinstance(plan.get("intent"), dict):
+                intent_analysis = plan["intent"]
             
-            try:
-                selection_text = selection_text.strip()
-                if selection_text.startswith('```json'):
-                    selection_text = selection_text[7:]
-                if selection_text.startswith('```'):
-                    selection_text = selection_text[3:]
-                if selection_text.endswith('```'):
-                    selection_text = selection_text[:-3]
-                
-                selected_indices = json.loads(selection_text.strip())
-                
-                if isinstance(selected_indices, list):
-                    selected_tables = []
-                    for idx in selected_indices:
-                        if isinstance(idx, int) and 1 <= idx <= len(search_results):
-                            selected_tables.append(search_results[idx - 1])
-                    return selected_tables[:5]
-                
-            except (json.JSONDecodeError, ValueError):
-                logger.warning("Failed to parse table selection")
+            selected_indices = plan.get("selected_tables")
+            if isinstance(selected_indices, list):
+                chosen = [
+                    search_results[idx - 1] for idx in selected_indices
+                    if isinstance(idx, int) and 1 <= idx <= len(search_results)
+                ]
+                if chosen:
+                    selected_tables = chosen[:5]
         
+        except (json.JSONDecodeError, AttributeError):
+            logger.warning("Failed to parse query plan JSON")
         except Exception as e:
-            logger.warning(f"Table selection failed: {e}")
+            logger.warning(f"Query planning failed: {e}")
+        
+        return intent_analysis, selected_tables
+
+    async def _search_candidates(self, command: str) -> List[Tuple]:
+        """Knowledge base hits offered to the query planner, most relevant first"""
+        store = self.enhanced_schema_store
+        if not settings.RERANKER_MODEL:
+            return await store.asearch(command, k=SEARCH_CANDIDATES)
         
-        return search_results[:5]
+        return await store.arerank(command, await store.asearch(command, k=RERANK_CANDIDATES), SEARCH_CANDIDATES)
+
+    def _table_columns(self, selected_tables: List[Tuple]) -> Dict[str, frozenset]:
+        """Column sets of the selected tables, built once per index version like their context blocks"""
+        columns = {}
+        for table_name, _, metadata in selected_tables:
+            if table_name not in self._column_set_cache:
+                self._column_set_cache[table_name] = _column_set(metadata)
+            if self._column_set_cache[table_name] is not None:
+                columns[table_name.lower()] = self._column_set_cache[table_name]
+        return columns
 
     def _build_comprehensive_schema_context(self, selected_tables: List[Tuple]) -> str:
         """Build detailed schema context for selected tables"""
         
-        context_parts = ["COMPREHENSIVE DATABASE SCHEMA INFORMATION:"]
-        context_parts.append("=" * 60)
+        # Table blocks only depend on the indexed metadata, so they are formatted once per index version
+        index_version = self.enhanced_schema_store.index_version if self.enhanced_schema_store else None
+        if index_version != self._table_context_version:
+            self._table_context_cache = {}
+            self._column_set_cache = {}
+            self._table_context_version = index_version
         
+        parts = []
         for table_name, schema_text, metadata in selected_tables:
-            context_parts.append(f"\nTABLE: {table_name}")
-            context_parts.append("-" * 40)
-            
-            if metadata and metadata.get("schema"):
-                schema = metadata["schema"]
-                
-                purpose = metadata.get('llm_analysis', {}).get('purpose', 'Data storage table')
-                context_parts.append(f"Business Purpose: {purpose}")
-                
-                context_parts.append("Column Definitions:")
-                for col in schema.get("columns", []):
-                    col_name = col['name']
-                    col_type = col['type']
-                    nullable = "NULL" if col.get("nullable", True) else "NOT NULL"
-                    extra_info = ""
-                    if col.get("autoincrement"):
-                        extra_info += " AUTO_INCREMENT"
-                    context_parts.append(f"  - {col_name}: {col_type} ({nullable}){extra_info}")
-                
-                if schema.get("primary_keys"):
-                    context_parts.append(f"Primary Key: {', '.join(schema['primary_keys'])}")
-                
-                if schema.get("foreign_keys"):
-                    context_parts.append("Foreign Key Relationships:")
-                    for fk in schema["foreign_keys"]:
-                        if isinstance(fk, dict):
-                            context_parts.append(f"  - {fk.get('column')} references {fk.get('referenced_table')}.{fk.get('referenced_column')}")
-                
-                if schema.get("sample_data") and len(schema["sample_data"]) > 0:
-                    context_parts.append("Sample Data (showing data patterns):")
-                    sample = schema["sample_data"][0]
-                    for key, value in list(sample.items())[:5]:
-                        if value is not None:
-                            context_parts.append(f"  - {key}: {repr(value)}")
-                
-                analysis = metadata.get("llm_analysis", {})
-                if analysis.get("data_patterns"):
-                    context_parts.append("Data Patterns:")
-                    for pattern in analysis["data_patterns"][:3]:
-                        context_parts.append(f"  - {pattern}")
-                
-                if analysis.get("relationships"):
-                    context_parts.append("Business Relationships:")
-                    for rel in analysis["relationships"][:2]:
-                        if isinstance(rel, dict):
-                            context_parts.append(f"  - Related to {rel.get('table')} via {rel.get('relationship_type')}")
-                        else:
-                            context_parts.append(f"  - {str(rel)}")
+            part = self._table_context_cache.get(table_name)
+            if part is None:
+                core = "\n".join(_table_core_lines(table_name, metadata))
+                details = "\n".join(_table_detail_lines(metadata))
+                part = (core, details, _estimate_tokens(core), _estimate_tokens(details) if details else 0)
+                self._table_context_cache[table_name] = part
+            parts.append(part)
         
-        return "\n".join(context_parts)
-
-    async def _generate_optimized_sql(self, user_query: str, intent_analysis: Dict, schema_context: str, date_context: str) -> str:
-        """Use LLM to generate optimized SQL with comprehensive context"""
+        # Tables arrive in relevance order: column definitions are packed first, sample data and
+        # analysis only while the prefill budget allows, and the most relevant table is always kept
+        budget = settings.SCHEMA_CONTEXT_TOKEN_BUDGET
+        included = []
+        for position, (core, details, core_tokens, details_tokens) in enumerate(parts):
+            if position and core_tokens > budget:
+                continue
+            budget -= core_tokens
+            included.append((selected_tables[position][0], core, details, details_tokens))
         
-        sql_generation_prompt = f"""You are an expert Microsoft SQL Server T-SQL developer. Generate the perfect SQL query based on the comprehensive analysis below.
-
-USER REQUEST: "{user_query}"
-
-USER INTENT ANALYSIS:
-{json.dumps(intent_analysis, indent=2)}
-
-{date_context}
-
-{schema_context}
-
-CRITICAL SQL GENERATION REQUIREMENTS:
-1. Use ONLY the exact table names and column names from the schema above
-2. Generate syntactically perfect Microsoft SQL Server T-SQL
-3. Use appropriate JOINs when data spans multiple tables
-4. Include proper WHERE clauses for filtering and date conditions
-5. Add aggregation functions (COUNT, SUM, AVG, MAX, MIN) if needed
-6. Include GROUP BY clauses when using aggregations
-7. Add ORDER BY clauses for sorting when appropriate
-8. Use TOP clause to limit results (default TOP 100 unless specified)
-9. Handle date/time filtering using proper SQL Server date functions
-10. Use full table names in format: TableName.ColumnName
-11. Do NOT use table aliases or AS clauses for tables
-12. Generate clean, executable, production-ready SQL
-
-IMPORTANT NOTES:
-- For date filtering, use appropriate functions like CAST, CONVERT, GETDATE(), DATEADD(), DATEDIFF()
-- For "today" queries, use: WHERE CAST(DateColumn AS DATE) = CAST(GETDATE() AS DATE)
-- For "this month" queries, use: WHERE MONTH(DateColumn) = MONTH(GETDATE()) AND YEAR(DateColumn) = YEAR(GETDATE())
-- For aggregations, always include GROUP BY for non-aggregated columns
-- Join tables using their foreign key relationships shown in the schema
-
-Generate the SQL query that perfectly fulfills the user's request:"""
-
-        if hasattr(self.llm, 'ainvoke'):
-            response = await self.llm.ainvoke(sql_generation_prompt)
-        else:
-            response = self.llm.invoke(sql_generation_prompt)
+        if len(included) < len(parts):
+            logger.info(f"Schema context budget kept {len(included)} of {len(parts)} tables")
         
-        if hasattr(response, 'content'):
-            return response.content
-        return str(response)
-
-    async def _validate_sql_with_llm(self, sql_query: str, schema_context: str, available_tables: List[str]) -> Tuple[bool, str]:
-        """Use LLM to validate the generated SQL"""
+        blocks = []
+        for table_name, core, details, details_tokens in included:
+            if details and details_tokens <= budget:
+                budget -= details_tokens
+                core = f"{core}\n{details}"
+            blocks.append((table_name, core))
         
-        table_names = [table[0] for table in available_tables] if isinstance(available_tables[0], tuple) else available_tables
+        # Name order gives the same schema prefix for the same table set, whatever order the LLM picked them in
+        blocks = [block for _, block in sorted(blocks)]
         
-        validation_prompt = f"""You are a SQL validation expert. Validate this SQL query against the provided schema.
+        return "\n".join(["COMPREHENSIVE DATABASE SCHEMA INFORMATION:", "=" * 60, *blocks])
 
-SQL QUERY TO VALIDATE:
-{sql_query}
+    def _sql_generation_prompt(self, user_query: str, intent_analysis: Dict, schema_context: str, date_context: str) -> str:
+        return SQL_GENERATION_PROMPT.format(
+            user_query=user_query,
+            intent_analysis=_format_intent(intent_analysis),
+            date_context=date_context,
+            schema_context=schema_context
+        )
 
-{schema_context}
+    async def _generate_optimized_sql(self, user_query: str, intent_analysis: Dict, schema_context: str, date_context: str) -> str:
+        """Use LLM to generate optimized SQL with comprehensive context"""
+        sql_generation_prompt = self._sql_generation_prompt(user_query, intent_analysis, schema_context, date_context)
+        return await self._complete(self.sql_llm, sql_generation_prompt)
 
-AVAILABLE TABLE NAMES: {', '.join(table_names)}
+    async def _generate_sql_batch(self, user_queries: List[str], intent_analysis: Dict, schema_context: str, date_context: str) -> List[str]:
+        """Generate SQL for several requests sharing one schema context in a single LLM call"""
+        numbered_queries = "\n".join(f"Q{i + 1}: {query}" for i, query in enumerate(user_queries))
+        
+        batch_prompt = SQL_BATCH_GENERATION_PROMPT.format(
+            user_queries=numbered_queries,
+            intent_analysis=_format_intent(intent_analysis),
+            date_context=date_context,
+            schema_context=schema_context
+        )
 
-VALIDATION REQUIREMENTS:
-1. Check if all table names in the SQL exist in the available tables
-2. Check if all column names exist in their respective tables
-3. Verify JOIN conditions use valid foreign key relationships
-4. Ensure syntax is correct for Microsoft SQL Server
-5. Check for any syntax errors or invalid constructs
+        batch_text = await self._complete(self.llm, batch_prompt)
+        
+        sql_by_number = {int(number): sql for number, sql in _BATCH_SQL_RE.findall(batch_text)}
+        return [self._clean_sql_output(sql_by_number.get(i + 1, "")) for i in range(len(user_queries))]
 
-Respond with a JSON object:
-{{
-    "is_valid": true/false,
-    "errors": ["error1", "error2"],
-    "suggestions": ["suggestion1", "suggestion2"]
-}}
+    async def _validate_sql_with_llm(self, sql_query: str, schema_context: str, table_names: List[str]) -> Tuple[bool, str]:
+        """Use LLM to validate the generated SQL"""
+        
+        validation_prompt = SQL_VALIDATION_PROMPT.format(
+            sql_query=sql_query,
+            schema_context=schema_context,
+            table_names=', '.join(table_names)
+        )
 
-Validation result:"""
+        # The prompt holds the SQL, schema context and table names, so equal prompts get equal verdicts
+        cache_key = hashlib.blake2b(validation_prompt.encode(), digest_size=16).digest()
+        cached = self._validation_cache.get(cache_key)
+        if cached is not None:
+            self._validation_cache.move_to_end(cache_key)
+            return cached
 
         try:
-            if hasattr(self.llm, 'ainvoke'):
-                response = await self.llm.ainvoke(validation_prompt)
-            else:
-                response = self.llm.invoke(validation_prompt)
-            
-            if hasattr(response, 'content'):
-                validation_text = response.content
-            else:
-                validation_text = str(response)
+            validation_text = await self._complete(self.json_llm, validation_prompt)
             
             try:
-                validation_text = validation_text.strip()
-                if validation_text.startswith('```json'):
-                    validation_text = validation_text[7:]
-                if validation_text.startswith('```'):
-                    validation_text = validation_text[3:]
-                if validation_text.endswith('```'):
-                    validation_text = validation_text[:-3]
-                
-                validation_result = json.loads(validation_text.strip())
+                validation_result = _parse_json_response(validation_text)
                 
                 is_valid = validation_result.get("is_valid", False)
                 errors = validation_result.get("errors", [])
                 error_message = "; ".join(errors) if errors else ""
                 
+                self._validation_cache[cache_key] = (is_valid, error_message)
+                if len(self._validation_cache) > VALIDATION_CACHE_SIZE:
+                    self._validation_cache.popitem(last=False)
+                
                 return is_valid, error_message
                 
             except json.JSONDecodeError:
@@ -400,83 +762,93 @@ Validation result:"""
             logger.warning(f"LLM validation failed: {e}")
             return False, f"Validation error: {str(e)}"
 
-    async def _fix_sql_with_llm(self, user_query: str, sql_query: str, validation_errors: str, schema_context: str, intent_analysis: Dict) -> str:
+    async def _fix_sql_with_llm(self, user_query: str, sql_query: str, validation_errors: str, schema_context: str, intent_text: str) -> str:
         """Use LLM to fix SQL based on validation errors"""
         
-        fix_prompt = f"""You are a SQL repair expert. Fix the SQL query based on the validation errors.
-
-ORIGINAL USER REQUEST: "{user_query}"
-
-USER INTENT: {json.dumps(intent_analysis, indent=2)}
+        fix_prompt = SQL_FIX_PROMPT.format(
+            user_query=user_query,
+            intent_analysis=intent_text,
+            sql_query=sql_query,
+            validation_errors=validation_errors,
+            schema_context=schema_context
+        )
 
-BROKEN SQL QUERY:
-{sql_query}
+        return await self._complete(self.sql_llm, fix_prompt)
 
-VALIDATION ERRORS:
-{validation_errors}
-
-{schema_context}
-
-INSTRUCTIONS:
-1. Fix all the validation errors mentioned above
-2. Use ONLY the exact table and column names from the schema
-3. Maintain the original intent and logic of the query
-4. Generate syntactically correct Microsoft SQL Server T-SQL
-5. Do NOT use table aliases
-6. Use full table names in format: TableName.ColumnName
-
-Generate the corrected SQL query:"""
-
-        if hasattr(self.llm, 'ainvoke'):
-            response = await self.llm.ainvoke(fix_prompt)
-        else:
-            response = self.llm.invoke(fix_prompt)
+    async def _validate_and_repair_sql(self, user_query: str, sql_query: str, intent_analysis: Dict, schema_context: str, table_names: List[str], table_columns: Optional[Dict[str, frozenset]] = None, max_attempts: int = 3) -> Tuple[str, Optional[str]]:
+        """Validate generated SQL and let the LLM repair it; returns the SQL and an error if it never passed"""
+        last_error = "LLM returned no SQL query"
+        intent_text = None
+        repaired_locally = False
+        attempt = 0
+        
+        # A local rewrite is always validated, even after the last attempt, without using up an attempt
+        while attempt < max_attempts or repaired_locally:
+            validating_rewrite = repaired_locally
+            repaired_locally = False
+            if not validating_rewrite:
+                if attempt > 0:
+                    logger.info(f"Step 4.{attempt + 1}: Repairing SQL with LLM (attempt {attempt + 1})...")
+                    # Formatted once, so every repair prompt repeats the same text up to the broken SQL
+                    if intent_text is None:
+                        intent_text = _format_intent(intent_analysis)
+                    sql_query = self._clean_sql_output(
+                        await self._fix_sql_with_llm(user_query, sql_query, last_error, schema_context, intent_text)
+                    )
+                attempt += 1
+            
+            if not sql_query.strip():
+                continue
+            
+            # Parsing proves errors, not correctness: SQL it finds no fault in is still checked by the LLM
+            verdict = _static_sql_check(sql_query, table_columns, table_names) if table_columns else None
+            if verdict is not None and not verdict[0]:
+                logger.info("Step 5: SQL rejected by schema check")
+                is_valid, validation_error = verdict
+            else:
+                logger.info("Step 5: Validating SQL with LLM...")
+                is_valid, validation_error = await self._validate_sql_with_llm(sql_query, schema_context, table_names)
+            
+            if is_valid:
+                logger.info("SQL validation successful!")
+                return sql_query, None
+            
+            last_error = validation_error
+            logger.warning(f"Validation failed: {validation_error}")
+            
+            # Mechanical mistakes are rewritten locally and validated again, instead of paying for an LLM repair
+            fixed_sql = _mechanical_sql_fix(sql_query, table_columns) if table_columns and not validating_rewrite else None
+            if fixed_sql and fixed_sql != sql_query:
+                fixed_verdict = _static_sql_check(fixed_sql, table_columns, table_names)
+                if fixed_verdict is None or fixed_verdict[0]:
+                    logger.info("SQL repaired locally, validating the rewrite")
+                    sql_query = fixed_sql
+                    repaired_locally = True
         
-        if hasattr(response, 'content'):
-            return response.content
-        return str(response)
+        if not sql_query.strip():
+            return sql_query, "LLM failed to generate valid SQL query"
+        return sql_query, f"Failed to generate valid SQL after {max_attempts} attempts. Last error: {last_error}"
 
     def _clean_sql_output(self, sql_output: str) -> str:
         """Clean SQL output from LLM"""
         if not sql_output:
             return ""
         
-        sql_output = sql_output.strip()
+        # Anything past the cap is runaway text, not SQL; the cut comes after reasoning blocks are removed
+        sql_output = _SQL_FENCE_RE.sub("", _THINK_RE.sub("", sql_output).strip()[:MAX_SQL_OUTPUT_CHARS])
+        sql_output = _SQL_COMMENT_LINE_RE.sub("", sql_output)
         
-        if sql_output.startswith("```sql"):
-            sql_output = sql_output[6:]
-        if sql_output.startswith("```"):
-            sql_output = sql_output[3:]
-        if sql_output.endswith("```"):
-            sql_output = sql_output[:-3]
-        
-        lines = sql_output.split('\n')
-        sql_lines = []
-        found_sql_start = False
-        
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith('--'):
-                continue
-            
-            if line.upper().startswith(('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')):
-                found_sql_start = True
-                sql_lines.append(line)
-            elif found_sql_start:
-                if any(indicator in line.lower() for indicator in ["generate the", "instructions:", "fix", "validation"]):
-                    break
-                sql_lines.append(line)
-        
-        if sql_lines:
-            sql_output = '\n'.join(sql_lines)
+        start_match = _SQL_START_LINE_RE.search(sql_output)
+        if start_match:
+            first_line_end = sql_output.find('\n', start_match.end())
+            end_match = _EXPLANATION_LINE_RE.search(sql_output, first_line_end + 1) if first_line_end != -1 else None
+            sql_output = sql_output[start_match.start():end_match.start() if end_match else None]
         else:
-            import re
-            select_match = re.search(r'(SELECT.*?)(?:\n\n|\Z)', sql_output, re.DOTALL | re.IGNORECASE)
+            select_match = _SQL_FALLBACK_RE.search(sql_output)
             if select_match:
                 sql_output = select_match.group(1)
         
-        sql_output = sql_output.replace('\\n', ' ').replace('\\t', ' ').replace('\\r', '')
-        sql_output = ' '.join(sql_output.split())
+        sql_output = _SQL_WHITESPACE_RE.sub(' ', sql_output.replace('\\r', '')).strip()
         
         if sql_output.endswith(';'):
             sql_output = sql_output[:-1].strip()
@@ -485,110 +857,193 @@ Generate the corrected SQL query:"""
 
     async def process_query(self, command: str, include_sql: bool = True) -> QueryResponse:
         """Main processing method - 100% LLM-driven"""
+        response = None
+        async for event, payload in self._query_events(command, stream_sql=False):
+            if event == "result":
+                response = payload
+        return response
+
+    async def process_query_stream(self, command: str) -> AsyncIterator[Tuple[str, Any]]:
+        """Like process_query, but yields ("sql", text) chunks while the SQL is generated and ("result", QueryResponse) last"""
+        async for event in self._query_events(command, stream_sql=True):
+            yield event
+
+    async def _query_events(self, command: str, stream_sql: bool) -> AsyncIterator[Tuple[str, Any]]:
         start_time = time.time()
         
         logger.info(f"Processing query with intelligent LLM analysis: {command[:100]}...")
         
         try:
             if not self.enhanced_schema_store or not self.enhanced_schema_store.is_metadata_loaded:
-                return QueryResponse(
+                yield "result", QueryResponse(
                     success=False,
                     command=command,
                     error="Knowledge base not loaded. Please upload metadata file first.",
                     execution_time=round(time.time() - start_time, 3)
                 )
+                return
             
-            logger.info("Step 1: Analyzing user intent with LLM...")
-            intent_analysis = await self._analyze_user_intent(command)
-            logger.info(f"Intent analysis: {intent_analysis.get('business_context', 'N/A')}")
+            cache_key = SemanticQueryCache.normalize(command)
+            cache_version = self.enhanced_schema_store.index_version
+            command_vector = None
+            
+            cached = self.query_cache.get_exact(cache_key, cache_version)
+            templated_sql = None
+            if cached is None:
+                # Same wording as an earlier successful request with different numbers ("top 5" -> "top 10")
+                templated_sql = self.query_cache.get_template(cache_key, cache_version)
+            if cached is None and templated_sql is None:
+                command_vector = await self.enhanced_schema_store.aembed_query(command)
+                cached = self.query_cache.get_similar(command, command_vector, cache_version)
             
-            logger.info("Step 2: Searching knowledge base for relevant tables...")
-            search_results = self.enhanced_schema_store.search(command, k=12)
+            if cached is not None:
+                logger.info("Serving SQL from the query cache")
+                yield "result", cached.model_copy(update={
+                    "command": command,
+                    "execution_time": round(time.time() - start_time, 3)
+                })
+                return
+            
+            if templated_sql is not None:
+                logger.info("Serving SQL from a learned query template")
+                yield "result", QueryResponse(
+                    success=True,
+                    command=command,
+                    sql_query=templated_sql,
+                    execution_time=round(time.time() - start_time, 3)
+                )
+                return
+            
+            logger.info("Step 1: Searching knowledge base for relevant tables...")
+            search_results = await self._search_candidates(command)
             if not search_results:
-                return QueryResponse(
+                yield "result", QueryResponse(
                     success=False,
                     command=command,
                     error="No relevant tables found in knowledge base",
                     execution_time=round(time.time() - start_time, 3)
                 )
+                return
             
-            logger.info("Step 3: LLM selecting most relevant tables...")
-            selected_tables = await self._select_relevant_tables(command, search_results, intent_analysis)
+            logger.info("Step 2: Analyzing intent and selecting tables with LLM...")
+            intent_analysis, selected_tables = await self._plan_query(command, search_results)
             table_names = [t[0] for t in selected_tables]
+            logger.info(f"Intent analysis: {intent_analysis.get('business_context', 'N/A')}")
             logger.info(f"Selected tables: {table_names}")
             
-            logger.info("Step 4: Building comprehensive schema context...")
+            logger.info("Step 3: Building comprehensive schema context...")
             schema_context = self._build_comprehensive_schema_context(selected_tables)
             date_context = self._get_current_date_context()
             
-            max_attempts = 3
-            sql_query = None
+            logger.info("Step 4: Generating SQL with LLM...")
+            if stream_sql:
+                chunks = []
+                async for chunk in self._stream_llm(
+                    self.sql_llm, self._sql_generation_prompt(command, intent_analysis, schema_context, date_context)
+                ):
+                    chunks.append(chunk)
+                    yield "sql", chunk
+                sql_query = "".join(chunks)
+            else:
+                sql_query = await self._generate_optimized_sql(command, intent_analysis, schema_context, date_context)
+            sql_query, error = await self._validate_and_repair_sql(
+                command, self._clean_sql_output(sql_query), intent_analysis, schema_context, table_names,
+                self._table_columns(selected_tables)
+            )
             
-            for attempt in range(max_attempts):
-                logger.info(f"Step 5.{attempt + 1}: Generating SQL with LLM (attempt {attempt + 1})...")
-                
-                if attempt == 0:
-                    sql_query = await self._generate_optimized_sql(command, intent_analysis, schema_context, date_context)
-                else:
-                    sql_query = await self._fix_sql_with_llm(command, sql_query, last_error, schema_context, intent_analysis)
-                
-                sql_query = self._clean_sql_output(sql_query)
-                
-                if not sql_query.strip():
-                    if attempt == max_attempts - 1:
-                        return QueryResponse(
-                            success=False,
-                            command=command,
-                            error="LLM failed to generate valid SQL query",
-                            execution_time=round(time.time() - start_time, 3)
-                        )
-                    continue
-                
-                logger.info("Step 6: Validating SQL with LLM...")
-                is_valid, validation_error = await self._validate_sql_with_llm(sql_query, schema_context, table_names)
-                
-                if is_valid:
-                    logger.info("SQL validation successful!")
-                    break
-                else:
-                    last_error = validation_error
-                    logger.warning(f"Validation failed: {validation_error}")
-                    
-                    if attempt == max_attempts - 1:
-                        return QueryResponse(
-                            success=False,
-                            command=command,
-                            error=f"Failed to generate valid SQL after {max_attempts} attempts. Last error: {validation_error}",
-                            sql_query=sql_query,
-                            execution_time=round(time.time() - start_time, 3)
-                        )
+            if error:
+                yield "result", QueryResponse(
+                    success=False,
+                    command=command,
+                    error=error,
+                    sql_query=sql_query or None,
+                    execution_time=round(time.time() - start_time, 3)
+                )
+                return
             
             execution_time = time.time() - start_time
             logger.info(f"Intelligent SQL generation completed successfully in {execution_time:.3f} seconds")
             
-            return QueryResponse(
+            response = QueryResponse(
                 success=True,
                 command=command,
                 sql_query=sql_query,
                 execution_time=round(execution_time, 3)
             )
+            # A response built while the knowledge base changed may come from either corpus, so it is not cached
+            if self.enhanced_schema_store.index_version == cache_version:
+                self.query_cache.put(cache_key, command_vector, cache_version, response)
+            
+            yield "result", response
         
         except Exception as e:
             execution_time = time.time() - start_time
             logger.error(f"Intelligent SQL generation failed: {str(e)}")
             
-            return QueryResponse(
+            yield "result", QueryResponse(
                 success=False,
                 command=command,
                 error=str(e),
                 execution_time=round(execution_time, 3)
             )
 
+    async def generate_sql_variations(self, command: str, variation_prompts: List[str]) -> List[QueryResponse]:
+        """Generate SQL for several phrasings of one request, sharing analysis and batching generation"""
+        start_time = time.time()
+        
+        def failed(prompt: str, error: str) -> QueryResponse:
+            return QueryResponse(
+                success=False,
+                command=prompt,
+                error=error,
+                execution_time=round(time.time() - start_time, 3)
+            )
+        
+        try:
+            if not self.enhanced_schema_store or not self.enhanced_schema_store.is_metadata_loaded:
+                return [failed(prompt, "Knowledge base not loaded. Please upload metadata file first.") for prompt in variation_prompts]
+            
+            search_results = await self._search_candidates(command)
+            if not search_results:
+                return [failed(prompt, "No relevant tables found in knowledge base") for prompt in variation_prompts]
+            
+            intent_analysis, selected_tables = await self._plan_query(command, search_results)
+            table_names = [t[0] for t in selected_tables]
+            schema_context = self._build_comprehensive_schema_context(selected_tables)
+            date_context = self._get_current_date_context()
+            
+            generated_sql = []
+            for start in range(0, len(variation_prompts), MAX_SQL_BATCH_SIZE):
+                batch = variation_prompts[start:start + MAX_SQL_BATCH_SIZE]
+                generated_sql.extend(await self._generate_sql_batch(batch, intent_analysis, schema_context, date_context))
+            
+            table_columns = self._table_columns(selected_tables)
+            repaired = await asyncio.gather(*(
+                self._validate_and_repair_sql(prompt, sql_query, intent_analysis, schema_context, table_names, table_columns)
+                for prompt, sql_query in zip(variation_prompts, generated_sql)
+            ))
+            
+            execution_time = round(time.time() - start_time, 3)
+            return [
+                QueryResponse(
+                    success=error is None,
+                    command=prompt,
+                    sql_query=sql_query or None,
+                    error=error,
+                    execution_time=execution_time
+                )
+                for prompt, (sql_query, error) in zip(variation_prompts, repaired)
+            ]
+        
+        except Exception as e:
+            logger.error(f"SQL variation generation failed: {str(e)}")
+            return [failed(prompt, str(e)) for prompt in variation_prompts]
+
     async def execute_direct_sql(self, sql_query: str) -> QueryResponse:
         start_time = time.time()
         
         try:
-            result = self.sql_db.run(sql_query)
+            result = await asyncio.to_thread(self.sql_db.run, sql_query)
             execution_time = time.time() - start_time
             
             return QueryResponse(
@@ -607,9 +1062,9 @@ Generate the corrected SQL query:"""
                 execution_time=round(execution_time, 3)
             )
     
-    def get_quick_health_status(self) -> dict:
+    async def get_quick_health_status(self) -> dict:
         try:
-            is_connected = self.database_service.test_connection()
+            is_connected = await asyncio.to_thread(self.database_service.test_connection)
             return {
                 "status": "healthy" if is_connected else "unhealthy",
                 "database_connected": is_connected
@@ -621,21 +1076,39 @@ Generate the corrected SQL query:"""
                 "error": str(e)
             }
     
+    def _sync_database_info_cache(self) -> None:
+        """Drop rendered DDL when the knowledge base was rebuilt or cleared"""
+        index_version = self.enhanced_schema_store.index_version if self.enhanced_schema_store else None
+        if index_version != self._database_info_version:
+            self._database_info_cache = None
+            self._table_description_cache = {}
+            self._database_info_version = index_version
+    
     def get_database_info(self) -> TableInfo:
+        # Rendering CREATE TABLE DDL for every table is slow on wide schemas, so it is done once per index version
+        self._sync_database_info_cache()
+        if self._database_info_cache is not None:
+            return self._database_info_cache
+        
         try:
             table_names = self.sql_db.get_usable_table_names()
             schema_info = self.sql_db.get_table_info()
             
-            return TableInfo(
+            self._database_info_cache = TableInfo(
                 table_names=table_names,
                 schema_info=schema_info
             )
+            return self._database_info_cache
         except Exception as e:
             raise QueryExecutionError(f"Failed to retrieve database information: {str(e)}")
     
     def get_table_description(self, table_name: str) -> dict:
         try:
-            result = self.sql_db.get_table_info([table_name])
+            self._sync_database_info_cache()
+            result = self._table_description_cache.get(table_name)
+            if result is None:
+                result = self.sql_db.get_table_info([table_name])
+                self._table_description_cache[table_name] = result
             
             return {
                 "table_name": table_name,
@@ -649,9 +1122,17 @@ Generate the corrected SQL query:"""
                 "success": False
             }
     
-    def get_health_status(self, include_table_count: bool = True) -> dict:
+    async def get_health_status(self, include_table_count: bool = True) -> dict:
         try:
-            is_connected = self.database_service.test_connection()
+            # Connection probe and table listing block on network I/O, so they run concurrently off the event loop
+            probes = [asyncio.to_thread(self.database_service.test_connection)]
+            if include_table_count:
+                probes.append(asyncio.to_thread(self.database_service.get_table_names))
+            probe_results = await asyncio.gather(*probes, return_exceptions=True)
+            
+            is_connected = probe_results[0]
+            if isinstance(is_connected, Exception):
+                raise is_connected
             
             if not is_connected:
                 return {
@@ -666,11 +1147,8 @@ Generate the corrected SQL query:"""
             }
             
             if include_table_count:
-                try:
-                    table_names = self.sql_db.get_usable_table_names()
-                    result["tables_count"] = len(table_names)
-                except Exception as e:
-                    result["tables_count"] = None
+                table_names = probe_results[1]
+                result["tables_count"] = None if isinstance(table_names, Exception) else len(table_names)
             
             if self.enhanced_schema_store:
                 kb_status = self.enhanced_schema_store.get_status()
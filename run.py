@@ -23,6 +23,7 @@ def main():
     logger.info(f"Starting {settings.API_TITLE} v{settings.API_VERSION}")
     logger.info(f"Host: {settings.API_HOST}:{settings.API_PORT}")
     logger.info(f"Log Level: {settings.LOG_LEVEL}")
+    logger.info(f"Workers: {settings.API_WORKERS}")
     
     try:
         uvicorn.run(
@@ -31,7 +32,12 @@ def main():
             port=settings.API_PORT,
             log_level=settings.LOG_LEVEL.lower(),
             reload=False,  # Set to True for development
-            workers=1,     # Increase for production
+            # Nothing is shared across workers: each holds its own knowledge base, schema cache and query caches,
+            # and knowledge base uploads reach one worker only, so API_WORKERS defaults to 1
+            workers=settings.API_WORKERS,
+            # uvloop and httptools are picked up automatically when installed
+            loop="auto",
+            http="auto",
             # Additional production settings
             access_log=True,
             use_colors=True,
@@ -0,0 +1,67 @@
+import numpy as np
+
+from app.schemas.query import QueryResponse
+from app.services.query_cache import SemanticQueryCache, literal_signature
+
+
+def unit_vector(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def response(command, sql_query):
+    return QueryResponse(success=True, command=command, sql_query=sql_query)
+
+
+def make_cache():
+    return SemanticQueryCache(max_entries=8, similarity_threshold=0.9, ttl_seconds=60)
+
+
+def test_exact_hit_uses_normalized_text():
+    cache = make_cache()
+    key = cache.normalize("Show all   Employees")
+    cache.get_exact(key, 1)
+    cache.put(key, unit_vector(1, 0), 1, response("Show all Employees", "SELECT * FROM employees"))
+    
+    assert cache.get_exact(cache.normalize("show all employees"), 1).sql_query == "SELECT * FROM employees"
+    assert cache.get_exact(cache.normalize("show all departments"), 1) is None
+
+
+def test_template_hit_substitutes_numbers():
+    cache = make_cache()
+    key = cache.normalize("top 5 employees by salary")
+    cache.get_exact(key, 1)
+    cache.put(key, unit_vector(1, 0), 1, response(key, "SELECT TOP 5 name FROM employees ORDER BY salary DESC"))
+    
+    assert cache.get_template(cache.normalize("top 10 employees by salary"), 1) == "SELECT TOP 10 name FROM employees ORDER BY salary DESC"
+    assert cache.get_template(cache.normalize("top employees by salary"), 1) is None
+
+
+def test_similar_hit_requires_matching_literals():
+    cache = make_cache()
+    command = "Orders placed by customer Smith"
+    cache.get_exact(cache.normalize(command), 1)
+    cache.put(cache.normalize(command), unit_vector(1, 0), 1, response(command, "SELECT * FROM orders WHERE customer = 'Smith'"))
+    
+    assert cache.get_similar("orders that customer Smith placed", unit_vector(1, 0.1), 1) is not None
+    assert cache.get_similar("Orders placed by customer Jones", unit_vector(1, 0.1), 1) is None
+    assert cache.get_similar("orders that customer Smith placed", unit_vector(0, 1), 1) is None
+
+
+def test_literal_signature_covers_quotes_months_and_comparisons():
+    assert literal_signature("sales in March") != literal_signature("sales in April")
+    assert literal_signature("salary greater than 5000") != literal_signature("salary less than 5000")
+    assert literal_signature("status 'open'") != literal_signature("status 'closed'")
+    assert literal_signature("list the customer's orders") == literal_signature("show the customer's orders")
+
+
+def test_fingerprint_change_drops_entries_and_stale_puts():
+    cache = make_cache()
+    key = cache.normalize("show all employees")
+    cache.get_exact(key, 1)
+    cache.put(key, unit_vector(1, 0), 1, response(key, "SELECT * FROM employees"))
+    
+    assert cache.get_exact(key, 2) is None
+    # Generated against fingerprint 1, so it must not land in the cache now tracking fingerprint 2
+    cache.put(key, unit_vector(1, 0), 1, response(key, "SELECT * FROM employees"))
+    assert cache.get_exact(key, 2) is None
@@ -0,0 +1,41 @@
+import numpy as np
+
+from app.services.schema_store import PersistentEnhancedSchemaVectorStore
+
+METADATA = {
+    "metadata": {"database_type": "Microsoft SQL Server"},
+    "tables": [
+        {"schema": {"table_name": "employees", "columns": [{"name": "id", "type": "int"}, {"name": "name", "type": "varchar"}]}},
+        {"schema": {"table_name": "departments", "columns": [{"name": "id", "type": "int"}, {"name": "dept_name", "type": "varchar"}]}},
+    ],
+}
+
+
+def fake_encode(texts):
+    rng = np.random.default_rng(len(texts))
+    embeddings = rng.standard_normal((len(texts), 8)).astype(np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def test_failed_rebuild_does_not_poison_unchanged_check(tmp_path, monkeypatch):
+    store = PersistentEnhancedSchemaVectorStore(database_service=None, storage_path=str(tmp_path))
+    monkeypatch.setattr(store, "_encode_texts", fake_encode)
+    
+    def failing_rebuild(*args, **kwargs):
+        raise MemoryError("encode ran out of memory")
+    
+    monkeypatch.setattr(store, "_rebuild_combined_index", failing_rebuild)
+    assert store.process_metadata(METADATA)["success"] is False
+    assert store.metadata_hash is None
+    assert not store.is_metadata_loaded
+    assert store.table_names == []
+    
+    monkeypatch.undo()
+    monkeypatch.setattr(store, "_encode_texts", fake_encode)
+    result = store.process_metadata(METADATA)
+    
+    assert result["success"] is True
+    assert result["message"] != "Metadata unchanged. Existing index kept."
+    assert store.index is not None and store.index.ntotal == 2
+    assert store.table_names == ["employees", "departments"]
+    assert store.process_metadata(METADATA)["message"] == "Metadata unchanged. Existing index kept."
@@ -0,0 +1,46 @@
+from app.services.schema_store import PersistentEnhancedSchemaVectorStore
+
+
+def make_store(storage_path):
+    return PersistentEnhancedSchemaVectorStore(database_service=None, storage_path=str(storage_path))
+
+
+def add_rows(store, *rows):
+    for text, text_type, identifier in rows:
+        store.combined_texts.append(text)
+        store.text_types.append(text_type)
+        store.text_identifiers.append(identifier)
+
+
+def test_jsonl_appends_are_replayed_on_load(tmp_path):
+    store = make_store(tmp_path)
+    add_rows(store, ("Table: employees", "schema", "employees"))
+    store._save_combined_texts()
+    add_rows(store, ("Revenue excludes refunds", "business_logic", "bl_0"), ("Table: departments", "schema", "departments"))
+    store._save_combined_texts()
+    
+    assert len(store._get_combined_texts_file().read_bytes().splitlines()) == 3
+    
+    reloaded = make_store(tmp_path)
+    assert reloaded.combined_texts == ["Table: employees", "Revenue excludes refunds", "Table: departments"]
+    assert reloaded.text_types == ["schema", "business_logic", "schema"]
+    assert reloaded.table_names == ["employees", "departments"]
+    assert reloaded.schema_texts == ["Table: employees", "Table: departments"]
+    assert reloaded._logged_text_rows == 3
+
+
+def test_partial_trailing_row_is_dropped(tmp_path):
+    store = make_store(tmp_path)
+    add_rows(store, ("Table: employees", "schema", "employees"))
+    store._save_combined_texts()
+    combined_file = store._get_combined_texts_file()
+    with open(combined_file, 'ab') as f:
+        f.write(b'{"text": "Table: depa')
+    
+    reloaded = make_store(tmp_path)
+    assert reloaded.combined_texts == ["Table: employees"]
+    assert reloaded.table_names == ["employees"]
+    
+    add_rows(reloaded, ("Table: departments", "schema", "departments"))
+    reloaded._save_combined_texts()
+    assert make_store(tmp_path).table_names == ["employees", "departments"]
@@ -0,0 +1,62 @@
+from app.services.text_to_sql import _mechanical_sql_fix, _static_sql_check
+
+TABLE_COLUMNS = {
+    "employees": frozenset({"id", "name", "dept_id", "salary"}),
+    "departments": frozenset({"id", "dept_name"}),
+}
+TABLE_NAMES = ["employees", "departments"]
+
+
+def check(sql_query):
+    return _static_sql_check(sql_query, TABLE_COLUMNS, TABLE_NAMES)
+
+
+def test_static_check_passes_valid_queries():
+    assert check("SELECT name, salary FROM employees WHERE salary > 5000") == (True, "")
+    assert check("SELECT e.name, d.dept_name FROM employees e JOIN departments d ON e.dept_id = d.id") == (True, "")
+    assert check("SELECT salary * 2 AS doubled FROM employees ORDER BY doubled") == (True, "")
+
+
+def test_static_check_rejects_unknown_tables_and_columns():
+    assert check("SELECT * FROM payroll") == (False, "Unknown tables: payroll")
+    assert check("SELECT bonus FROM employees") == (False, "Unknown columns: bonus")
+    assert check("SELECT e.bonus FROM employees e") == (False, "Unknown columns: e.bonus")
+
+
+def test_static_check_rejects_unbound_qualifiers():
+    assert check("SELECT Orders.id FROM employees") == (False, "Unknown table names or aliases: Orders")
+    assert check("SELECT o.name FROM employees e") == (False, "Unknown table names or aliases: o")
+
+
+def test_static_check_rejects_ambiguous_columns():
+    verdict = check("SELECT id FROM employees JOIN departments ON dept_id = departments.id")
+    assert verdict == (False, "Ambiguous columns, qualify them with their table: id")
+
+
+def test_static_check_rejects_limit():
+    assert check("SELECT name FROM employees LIMIT 5") == (False, "LIMIT is not supported by SQL Server; use TOP")
+
+
+def test_static_check_is_undecided_for_derived_sources_and_missing_metadata():
+    assert check("SELECT x.name FROM (SELECT name FROM employees) x") is None
+    assert check("WITH c AS (SELECT name FROM employees) SELECT name FROM c") is None
+    assert _static_sql_check("SELECT name FROM employees", {}, TABLE_NAMES) is None
+    assert check("not sql at all (") is None
+
+
+def test_mechanical_fix_rewrites_limit_and_aliases():
+    assert _mechanical_sql_fix("SELECT name FROM employees LIMIT 5", TABLE_COLUMNS) == "SELECT TOP 5 employees.name FROM employees"
+    fixed = _mechanical_sql_fix("SELECT e.name, d.dept_name FROM employees e JOIN departments d ON e.dept_id = d.id", TABLE_COLUMNS)
+    assert fixed == "SELECT employees.name, departments.dept_name FROM employees JOIN departments ON employees.dept_id = departments.id"
+    assert check(fixed) == (True, "")
+
+
+def test_mechanical_fix_moves_columns_to_their_only_owner():
+    fixed = _mechanical_sql_fix("SELECT departments.salary FROM employees JOIN departments ON employees.dept_id = departments.id", TABLE_COLUMNS)
+    assert fixed == "SELECT employees.salary FROM employees JOIN departments ON employees.dept_id = departments.id"
+
+
+def test_mechanical_fix_leaves_self_joins_and_derived_sources_alone():
+    assert _mechanical_sql_fix("SELECT a.name FROM employees a JOIN employees b ON a.id = b.id", TABLE_COLUMNS) is None
+    assert _mechanical_sql_fix("WITH c AS (SELECT name FROM employees) SELECT name FROM c LIMIT 5", TABLE_COLUMNS) is None
+    assert _mechanical_sql_fix("SELECT x.name FROM (SELECT name FROM employees) x", TABLE_COLUMNS) is None
@@ -0,0 +1,59 @@
+import asyncio
+
+from app.services.text_to_sql import TextToSQLService
+
+TABLE_COLUMNS = {"employees": frozenset({"id", "name", "salary"})}
+TABLE_NAMES = ["employees"]
+
+
+def make_service(validation_results):
+    service = object.__new__(TextToSQLService)
+    service.validated = []
+    service.fix_calls = 0
+    
+    async def validate(sql_query, schema_context, table_names):
+        service.validated.append(sql_query)
+        return validation_results.pop(0)
+    
+    async def fix(*args):
+        service.fix_calls += 1
+        return "SELECT name FROM employees"
+    
+    service._validate_sql_with_llm = validate
+    service._fix_sql_with_llm = fix
+    return service
+
+
+def repair(service, sql_query, max_attempts):
+    return asyncio.run(service._validate_and_repair_sql(
+        "top 5 employees", sql_query, {}, "", TABLE_NAMES, TABLE_COLUMNS, max_attempts=max_attempts
+    ))
+
+
+def test_local_rewrite_on_final_attempt_is_validated():
+    service = make_service([(True, "")])
+    
+    sql_query, error = repair(service, "SELECT name FROM employees LIMIT 5", max_attempts=1)
+    
+    assert (sql_query, error) == ("SELECT TOP 5 employees.name FROM employees", None)
+    assert service.validated == ["SELECT TOP 5 employees.name FROM employees"]
+    assert service.fix_calls == 0
+
+
+def test_failed_local_rewrite_reports_its_own_error():
+    service = make_service([(False, "Wrong aggregation")])
+    
+    sql_query, error = repair(service, "SELECT name FROM employees LIMIT 5", max_attempts=1)
+    
+    assert sql_query == "SELECT TOP 5 employees.name FROM employees"
+    assert error.endswith("Last error: Wrong aggregation")
+    assert service.fix_calls == 0
+
+
+def test_local_rewrite_does_not_use_up_an_llm_attempt():
+    service = make_service([(True, "")])
+    
+    repair(service, "SELECT name FROM employees LIMIT 5", max_attempts=2)
+    
+    assert service.fix_calls == 0
+    assert len(service.validated) == 1